@@ -1,61 +1,113 @@
 # Decorators for api routes
-from flask import Flask, abort, request
+from flask import Flask, Response, abort, request, g
 # JSON format for responses
 from flask import jsonify
 # NLP processing
 from preprocess import preprocess
+import preprocess as nlp
 # Ontology searches: local and external (DBPedia)
 import ontology
 import dbpedia
+# Autocompletado
+import suggest
+# Caché de respuestas con ETag
+from response_cache import cached
 # Google Translator API
-from translator import translate as translate_
+from translator import translate as translate_, translate_many
 # Structure output format
-from restructure import struct_class
+from restructure import struct_class, encode_cursor, decode_cursor
 # CORS web
 from flask_cors import CORS
 # Paralelismo
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import json
+import time
+# Tiempos por etapa y /metrics
+import metrics
 
 def create_app():
     app = Flask(__name__)
     return app
 
 app = create_app()
-CORS(app)
+# El cursor de la pagina siguiente viaja en un header para no cambiar el cuerpo de las respuestas
+CORS(app, expose_headers=['X-Next-Cursor', 'Server-Timing', 'ETag'])
 
-# Pool de threads para búsquedas paralelas
-executor = ThreadPoolExecutor(max_workers=2)
+# Pool de threads para búsquedas paralelas (ontologia, caché DBPedia y DBPedia online)
+executor = ThreadPoolExecutor(max_workers=6)
+# Indices de autocompletado de cada idioma, construidos en segundo plano
+suggest.warm_up()
+# Queries maximas por peticion a /search/batch
+SEARCH_BATCH_MAX = int(os.environ.get('SEARCH_BATCH_MAX', 1000))
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def finish_timing(response):
+    total = time.perf_counter() - g.request_start
+    metrics.requests.observe(request.endpoint or 'unknown', total)
+    metrics.responses.inc(response.status_code)
+    if metrics.SERVER_TIMING:
+        response.headers['Server-Timing'] = metrics.server_timing(metrics.request_timings(), total)
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
 
 """ API ROUTES """
 @app.route('/searchClass', methods=['GET'])
+@cached
 def searchClass(): 
     query=  request.args['query']
     #query = translate_(request.args['query'], dest='es')
     lang = request.args['lang']
+    depth = request.args.get('depth', type=int)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
     if query is None: 
         abort(404, f"Class {query} not exists")
-    return jsonify(ontology.getInstancesByClass(query, lang))
+    check_page(limit)
+
+    try:
+        instances, next_cursor = ontology.getInstancesByClass(query, lang, request_fields(), depth, limit, cursor)
+    except ValueError as e:
+        abort(400, str(e))
+    return paginated(jsonify(instances), next_cursor)
 
 @app.route('/search', methods=['GET'])
+@cached(query=preprocess)
 def search():
-    query = preprocess(request.args['query'])
     lang = request.args['lang']
+    fields = request_fields()
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor')
+
+    if cursor:
+        try:
+            offset = decode_cursor(cursor)
+        except ValueError as e:
+            abort(400, str(e))
+    check_page(limit, offset)
 
+    query = preprocess(request.args['query'])
     if query is None:
         return jsonify({'error': 'Must have a query'})
 
-    # Pre-procesar traducciones una sola vez
-    query_en = preprocess(translate_(query, dest='en'))
-    query_es = preprocess(translate_(query, dest='es'))
-
-    # Ejecutar búsquedas en paralelo
-    future_dbpedia = executor.submit(dbpedia.searchDBPedia, query_en)
-    future_ontology = executor.submit(ontology.search, query_es)
+    # Cada fuente traduce su query en paralelo con la otra búsqueda
+    future_dbpedia = metrics.submit(executor, search_dbpedia_cache, query, limit, offset, fields)
+    future_ontology = metrics.submit(executor, search_ontology, query, limit, offset, fields)
 
     # Esperar resultados
     result = future_ontology.result()
     result_dbpedia = future_dbpedia.result()
 
+    # Hay pagina siguiente si alguna fuente lleno la pagina actual
+    full_page = limit is not None and limit in (sum(len(hits) for hits in result.values()), len(result_dbpedia))
+    next_cursor = encode_cursor(offset + limit) if full_page else None
+
     if len(result_dbpedia) != 0:
         result['DBPedia (Cache Local)'] = result_dbpedia
 
@@ -63,8 +115,175 @@ def search():
         msg = translate_('No existen busquedas encontradas', dest=lang)
         result[msg] = []
 
-    return result
+    return paginated(jsonify(result), next_cursor)
     
+@app.route('/search/batch', methods=['POST'])
+def searchBatch():
+    """
+    BÚSQUEDA POR LOTES: Resuelve muchas queries en una sola peticion.
+
+    Cuerpo JSON: {"queries": [...], "lang": "es", "limit": 10, "offset": 0,
+    "fields": ["iri", "score"]}. Las queries se preprocesan juntas con
+    nlp.pipe, se traducen sin repetir textos y se puntuan todas contra cada
+    corpus en una sola operacion (query x corpus). Devuelve un resultado por
+    query, en el mismo orden y con el mismo formato que /search.
+    """
+    body = request.get_json(silent=True) or {}
+    raw_queries = body.get('queries')
+    if not isinstance(raw_queries, list) or not all(isinstance(query, str) for query in raw_queries):
+        abort(400, "Se requiere 'queries': una lista de strings")
+    if len(raw_queries) > SEARCH_BATCH_MAX:
+        abort(400, f"Máximo {SEARCH_BATCH_MAX} queries por petición")
+    limit = body.get('limit')
+    offset = body.get('offset', 0)
+    # bool es subclase de int: true/false no son paginas validas
+    if (limit is not None and (not isinstance(limit, int) or isinstance(limit, bool))
+            or not isinstance(offset, int) or isinstance(offset, bool)):
+        abort(400, "'limit' y 'offset' deben ser enteros")
+    check_page(limit, offset)
+    fields = body.get('fields')
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        abort(400, "'fields' debe ser un string separado por comas o una lista de strings")
+    fields = {field.strip() for field in fields if field.strip()} if fields else None
+    lang = body.get('lang', 'es')
+    if not isinstance(lang, str):
+        abort(400, "'lang' debe ser un string")
+
+    queries = nlp.preprocess_batch(raw_queries)
+    # Cada fuente traduce todas las queries en paralelo con la otra
+    future_es = metrics.submit(executor, translate_many, queries, 'es')
+    future_en = metrics.submit(executor, translate_many, queries, 'en')
+    queries_es = nlp.preprocess_batch(future_es.result())
+    queries_en = nlp.preprocess_batch(future_en.result())
+
+    future_dbpedia = metrics.submit(executor, dbpedia.searchDBPediaBatch, queries_en, limit, offset, fields)
+    results = ontology.search_batch(queries_es, limit, offset, fields)
+    results_dbpedia = future_dbpedia.result()
+
+    response = []
+    msg = None
+    for query, result, result_dbpedia in zip(raw_queries, results, results_dbpedia):
+        if len(result_dbpedia) != 0:
+            result['DBPedia (Cache Local)'] = result_dbpedia
+        if len(result) == 0:
+            if msg is None:
+                msg = translate_('No existen busquedas encontradas', dest=lang)
+            result[msg] = []
+        response.append({'query': query, 'results': result})
+    return jsonify(response)
+
+@app.route('/suggest', methods=['GET'])
+def suggestions():
+    """
+    AUTOCOMPLETADO: Sugerencias para un prefijo (nombres de individuos,
+    clases y etiquetas de DBPedia), sin spaCy, traducciones ni búsqueda fuzzy.
+    """
+    prefix = request.args.get('q', request.args.get('query', ''))
+    lang = request.args.get('lang', 'es')
+    k = request.args.get('k', suggest.DEFAULT_K, type=int)
+    return jsonify({'query': prefix, 'suggestions': suggest.suggest(prefix, lang, k)})
+
+@app.route('/classes', methods=['GET'])
+@cached
+def classes():
+    """
+    CATÁLOGO DE CLASES: jerarquía, ancestros/descendientes y cantidad de
+    instancias de cada clase. Con name=X solo esa clase (el nombre puede
+    venir en otro idioma o con otras mayúsculas); con lang=xx agrega 'label'
+    traducido.
+    """
+    name = request.args.get('name')
+    result = ontology.classes(name, request.args.get('lang'))
+    if result is None:
+        abort(404, f"Class {name} not exists")
+    return jsonify(result)
+
+@app.route('/searchStream', methods=['GET'])
+def searchStream():
+    """
+    BÚSQUEDA EN STREAMING: Igual que /search pero responde NDJSON, una línea
+    por fuente apenas termina (ontología local, caché DBPedia y, con
+    online=1, DBPedia online), seguida de una línea final {"done": true}.
+    """
+    lang = request.args.get('lang', 'es')
+    fields = request_fields()
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    online = request.args.get('online', '0') == '1'
+    check_page(limit, offset)
+    raw_query = request.args.get('query', '')
+    query = preprocess(raw_query)
+
+    if not query:
+        return jsonify({'error': 'Must have a query'})
+
+    futures = {
+        metrics.submit(executor, search_ontology, query, limit, offset, fields): 'Ontologia Local',
+        metrics.submit(executor, search_dbpedia_cache, query, limit, offset, fields): 'DBPedia (Cache Local)',
+    }
+    if online:
+        # Como en /searchOnline, la fuente online traduce la query original
+        futures[metrics.submit(executor, search_dbpedia_online, raw_query, lang)] = 'DBPedia Online (SPARQL Endpoint)'
+
+    def generate():
+        for future in as_completed(futures):
+            try:
+                chunk = {'source': futures[future], 'results': future.result()}
+            except Exception as e:
+                chunk = {'source': futures[future], 'error': str(e)}
+            yield json.dumps(chunk, ensure_ascii=False) + '\n'
+        yield json.dumps({'done': True}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/dlquery', methods=['GET'])
+def dlquery():
+    """
+    CONSULTA DL: Evalúa una expresión de clase en sintaxis Manchester
+    (that, and, or, some, only, value) sobre los hechos de la ontología.
+    """
+    query = request.args.get('query', '')
+    limit = request.args.get('limit', type=int)
+    check_page(limit)
+
+    if not query:
+        return jsonify({'error': 'Se requiere un parámetro query'})
+
+    try:
+        results = ontology.dl_query(query, limit)
+    except ValueError as e:
+        abort(400, str(e))
+
+    return jsonify({
+        'query': query,
+        'results': results,
+        'count': len(results)
+    })
+
+@app.route('/sparql', methods=['GET', 'POST'])
+def sparql():
+    """
+    SPARQL LOCAL: Ejecuta una consulta SELECT sobre la ontología cargada.
+    Acepta query por GET o POST (formulario), como un endpoint SPARQL.
+    """
+    query = request.values.get('query', '')
+    limit = request.values.get('limit', type=int)
+    check_page(limit)
+
+    if not query:
+        return jsonify({'error': 'Se requiere un parámetro query'})
+
+    try:
+        results = ontology.sparql(query, limit)
+    except ValueError as e:
+        abort(400, str(e))
+
+    response = jsonify(results)
+    response.mimetype = 'application/sparql-results+json'
+    return response
+
 @app.route('/searchOnline', methods=['GET'])
 def searchOnline():
     """
@@ -77,11 +296,8 @@ def searchOnline():
     if not query:
         return jsonify({'error': 'Se requiere un parámetro query'})
 
-    # Traducir query al inglés para mejor búsqueda en DBPedia
-    query_en = translate_(query, dest='en')
-
-    # Búsqueda online a DBPedia
-    result_online = dbpedia.searchDBPediaOnline(query_en, lang)
+    # Búsqueda online a DBPedia (query traducida al inglés)
+    result_online = search_dbpedia_online(query, lang)
 
     return jsonify({
         'source': 'DBPedia Online (SPARQL Endpoint)',
@@ -91,10 +307,11 @@ def searchOnline():
     })
 
 @app.route('/searchOffline', methods=['GET'])
+@cached(query=preprocess)
 def searchOffline():
     """
-    BÚSQUEDA OFFLINE: Busca en el caché local de 500 enfermedades
-    descargadas de DBPedia al iniciar la aplicación.
+    BÚSQUEDA OFFLINE: Busca en el snapshot local de enfermedades de DBPedia
+    (generado con dbpedia_snapshot.py).
     No requiere conexión a internet.
     """
     query = preprocess(request.args.get('query', ''))
@@ -107,12 +324,49 @@ def searchOffline():
     result_offline = dbpedia.searchDBPedia(query)
 
     return jsonify({
-        'source': 'DBPedia Offline (Caché Local - 500 enfermedades)',
+        'source': 'DBPedia Offline (Snapshot Local)',
         'query': query,
         'results': result_offline,
         'count': len(result_offline)
     })
 
+@app.route('/export', methods=['POST'])
+def export():
+    """
+    Escribe la ontología actual (con las adiciones) al archivo .owx.
+    Con ONTOLOGY_BACKEND=sqlite las adiciones solo llegan al .owx por aquí.
+    """
+    return jsonify({'file': ontology.export_ontology()})
+
+@app.route('/reload', methods=['POST'])
+def reload():
+    """
+    Recarga la ontología desde el .owx en segundo plano. Las peticiones
+    siguen respondiendo con el snapshot anterior hasta el reemplazo.
+    """
+    if ontology.BACKEND != 'file':
+        abort(409, "La recarga en caliente requiere ONTOLOGY_BACKEND=file")
+    ontology.reload_in_background()
+    return jsonify({'reloading': True}), 202
+
+@app.route('/metrics', methods=['GET'])
+def route_metrics():
+    """
+    Métricas en formato de texto de Prometheus: histogramas por etapa y por
+    endpoint, respuestas por código y hits/misses de los cachés.
+    """
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness: qué componentes ya están cargados. Responde 503 hasta que los
+    índices de búsqueda estén listos (spaCy y la ontología cargan bajo demanda).
+    """
+    components = {'spacy': nlp.is_loaded(), **ontology.status(), **dbpedia.status()}
+    ready = components['search_index'] and components['dbpedia_index'] and components['classes']
+    return jsonify({'ready': ready, 'components': components}), 200 if ready else 503
+
 @app.route('/addition', methods=['GET'])
 def route_addition():
     query = request.args['query']
@@ -121,6 +375,52 @@ def route_addition():
     return jsonify(dbpedia.storeData(translate_(query, dest='en'), request.args['lang']))
     # return jsonify(dbpedia.verificate_name(query))
 
+def search_ontology(query, limit=None, offset=0, fields=None):
+    """
+    Local ontology source: translates the query to Spanish and searches the local index.
+    """
+    query_es = preprocess(translate_(query, dest='es'))
+    return ontology.search(query_es, limit, offset, fields)
+
+def search_dbpedia_cache(query, limit=None, offset=0, fields=None):
+    """
+    DBPedia snapshot source: translates the query to English and searches the local DBPedia index.
+    """
+    query_en = preprocess(translate_(query, dest='en'))
+    return dbpedia.searchDBPedia(query_en, limit, offset, fields)
+
+def search_dbpedia_online(query, lang):
+    """
+    DBPedia online source: translates the query to English and queries the SPARQL endpoint.
+    """
+    return dbpedia.searchDBPediaOnline(translate_(query, dest='en'), lang)
+
+def request_fields():
+    """
+    Set of fields requested with `fields=a,b,c`, or None for every field.
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+def check_page(limit, offset=0):
+    """
+    Abort with 400 unless limit is None or positive and offset is not negative.
+    """
+    if limit is not None and limit < 1:
+        abort(400, "'limit' debe ser mayor que 0")
+    if offset < 0:
+        abort(400, "'offset' no puede ser negativo")
+
+def paginated(response, next_cursor):
+    """
+    Attach the cursor of the next page to a response.
+    """
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 def translate(result, lang):
     for class_ in result.keys():
         class_instances = result[class_]
@@ -0,0 +1,272 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from sparql_stub import FakeEndpoint
+
+"""
+BENCHMARKS
+
+Mide el arranque (frio y con caché de indices), la latencia y el throughput
+de ontology.search y dbpedia.searchDBPedia, getInstancesByClass de las clases
+mas grandes y /addition (storeData + store_in_ontology), sobre la ontologia
+incluida y copias sinteticas escaladas (individuos replicados N veces).
+
+La traduccion se reemplaza por una funcion local (identidad, con latencia
+opcional) y el endpoint SPARQL de DBPedia por un servidor HTTP local, asi
+las corridas no dependen de la red y se pueden comparar entre si.
+
+    python benchmark.py [--scales 1,10,100] [--iterations 200] [--output resultados.json]
+
+Cada escala corre en un proceso aparte con su propio directorio temporal
+(ontologia, snapshot de DBPedia, caché de indices y de traducciones).
+"""
+
+HERE = Path(__file__).parent.resolve()
+BUNDLED_ONTOLOGY = HERE.parent.parent/"resourse/ontology.owx"
+
+# Vocabulario del snapshot sintetico de DBPedia
+_QUALIFIERS = ['acute', 'chronic', 'malignant', 'benign', 'metastatic', 'juvenile', 'hereditary', 'primary',
+               'secondary', 'invasive', 'recurrent', 'familial']
+_ORGANS = ['lung', 'breast', 'colon', 'prostate', 'liver', 'pancreas', 'skin', 'stomach', 'kidney', 'bladder',
+           'ovarian', 'cervical', 'thyroid', 'bone', 'brain', 'blood']
+_KINDS = ['carcinoma', 'sarcoma', 'lymphoma', 'leukemia', 'melanoma', 'adenoma', 'neoplasm', 'tumor',
+          'syndrome', 'disease']
+# Palabra que el servidor SPARQL falso usa para responder verificate_name en /addition
+ADDITION_QUERY = 'carcinoma'
+
+def percentiles(samples, seconds=None):
+    """
+    Latency summary (milliseconds) of a list of per-call durations in seconds.
+    """
+    ordered = sorted(samples)
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    total = seconds if seconds is not None else sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'throughput_per_s': round(len(ordered) / total, 1) if total else None
+    }
+
+def measure(function, inputs):
+    """
+    Call `function` once per input and summarize the latencies.
+    """
+    samples = []
+    start = time.perf_counter()
+    for value in inputs:
+        call_start = time.perf_counter()
+        function(value)
+        samples.append(time.perf_counter() - call_start)
+    return percentiles(samples, time.perf_counter() - start)
+
+def scale_ontology(source, target, factor):
+    """
+    Write a copy of an ontology with every individual replicated `factor` times.
+
+    Replicas keep their types, data values and annotations; object property
+    values point to the individuals of the same replica, so the graph
+    structure (and the size of every class) grows linearly.
+    """
+    from owlready2 import World
+
+    world = World()
+    ontologie = world.get_ontology(str(source)).load()
+    individuals = {individual.storid: individual.iri for individual in ontologie.individuals()}
+
+    obj_triples = [triple for triple in ontologie._get_obj_triples_spo_spo(None, None, None) if triple[0] in individuals]
+    data_triples = [triple for triple in ontologie._get_data_triples_spod_spod(None, None, None, None)
+                    if triple[0] in individuals]
+    for replica in range(1, factor):
+        clones = {storid: world._abbreviate(f"{iri}_r{replica}") for storid, iri in individuals.items()}
+        for s, p, o in obj_triples:
+            ontologie._add_obj_triple_spo(clones[s], p, clones.get(o, o))
+        for s, p, o, d in data_triples:
+            ontologie._add_data_triple_spod(clones[s], p, o, d)
+
+    ontologie.save(file=str(target), format='rdfxml')
+    return len(individuals) * factor
+
+def synthetic_snapshot(target, size, seed=0):
+    """
+    Write a DBPedia snapshot (same format as dbpedia_snapshot.py) with `size` disease names.
+    """
+    from preprocess import preprocess_batch
+
+    rng = random.Random(seed)
+    labels = []
+    for i in range(size):
+        words = [rng.choice(_QUALIFIERS), rng.choice(_ORGANS), rng.choice(_KINDS)]
+        labels.append(' '.join(words) + (f" type {i // 2000 + 1}" if i >= 2000 else ''))
+    names = preprocess_batch(labels)
+    with open(target, 'w', encoding='utf-8') as f:
+        for label, name in zip(labels, names):
+            iri = 'http://dbpedia.org/resource/' + label.replace(' ', '_')
+            f.write(json.dumps({'iri': iri, 'label': label, 'name': name}, ensure_ascii=False) + '\n')
+    return labels
+
+def run_scale(args):
+    """
+    Child process: measure every stage against the environment prepared by the parent.
+    """
+    import translator
+
+    # Traduccion falsa: identidad con latencia opcional, pasando por el caché real
+    def fake_translate(text, dest):
+        time.sleep(args.translate_latency / 1000)
+        return text
+    translator.Translate = fake_translate
+
+    results = {}
+    start = time.perf_counter()
+    import ontology
+    import dbpedia
+    from preprocess import preprocess
+    results['import_s'] = round(time.perf_counter() - start, 3)
+
+    rng = random.Random(args.seed)
+    index = ontology.build_search_index()
+    names = [entry['nombre'] for entry in index.payloads if entry]
+    queries = [preprocess(rng.choice(names)) for _ in range(args.iterations)]
+    results['individuals'] = len(index)
+    results['preprocess'] = measure(preprocess, [rng.choice(names) + ' extra' for _ in range(args.iterations)])
+    results['ontology_search'] = measure(ontology.search, queries)
+    results['ontology_search_limit_10'] = measure(lambda query: ontology.search(query, limit=10), queries)
+
+    diseases = [entry['name'] for entry in dbpedia.build_dbpedia_index().payloads if entry]
+    results['dbpedia_entries'] = len(diseases)
+    dbpedia_queries = [rng.choice(diseases) for _ in range(args.iterations)]
+    results['dbpedia_search'] = measure(dbpedia.searchDBPedia, dbpedia_queries)
+    results['dbpedia_search_limit_10'] = measure(lambda query: dbpedia.searchDBPedia(query, limit=10), dbpedia_queries)
+
+    # Clases con mas instancias: primera llamada (estructura) y siguientes (materializadas)
+    ontologie = ontology.get_ontologie()
+    sizes = sorted(((len(class_.instances()), class_.name) for class_ in ontologie.classes()), reverse=True)
+    results['classes'] = {}
+    for size, name in sizes[:args.classes]:
+        cold = measure(lambda _: ontology.getInstancesByClass(name, 'es'), [None])
+        warm = measure(lambda _: ontology.getInstancesByClass(name, 'es'), range(args.class_iterations))
+        page = measure(lambda _: ontology.getInstancesByClass(name, 'es', limit=20), range(args.class_iterations))
+        results['classes'][name] = {'instances': size, 'cold': cold, 'warm': warm, 'page_20': page}
+
+    results['addition'] = measure(lambda _: dbpedia.storeData(ADDITION_QUERY, 'en'), range(args.additions))
+    results['individuals_after_additions'] = len(index)
+    return results
+
+def run_parent(args):
+    scales = [int(scale) for scale in args.scales.split(',')]
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args)
+        },
+        'scales': {}
+    }
+
+    for scale in scales:
+        workdir = Path(tempfile.mkdtemp(prefix=f"benchmark-x{scale}-"))
+        try:
+            print(f"== escala x{scale} ({workdir})", file=sys.stderr)
+            ontology_path = workdir/"ontology.owl"
+            build_start = time.perf_counter()
+            if scale == 1:
+                shutil.copy(BUNDLED_ONTOLOGY, ontology_path)
+            else:
+                scale_ontology(BUNDLED_ONTOLOGY, ontology_path, scale)
+            labels = synthetic_snapshot(workdir/"dbpedia.jsonl", args.diseases * scale, args.seed)
+            print(f"   datos sinteticos en {time.perf_counter() - build_start:.1f}s", file=sys.stderr)
+
+            env = dict(os.environ,
+                       ONTOLOGY_PATH=str(ontology_path),
+                       ONTOLOGY_BACKEND='file',
+                       ONTOLOGY_WATCH_INTERVAL='0',
+                       ONTOLOGY_INFERRED='0',
+                       DBPEDIA_SNAPSHOT_PATH=str(workdir/"dbpedia.jsonl"),
+                       DBPEDIA_REFRESH_INTERVAL='0',
+                       INDEX_CACHE_DIR=str(workdir/"index_cache"),
+                       TRANSLATION_CACHE_PATH=str(workdir/"translations.sqlite3"),
+                       TRANSLATION_OFFLINE='1')
+
+            # Arranque: primero sin caché de indices (construye todo), despues con caché
+            startup = {}
+            for label in ('cold_start_s', 'warm_start_s'):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, '-c', 'import ontology, dbpedia'], cwd=HERE, env=env,
+                               check=True, stdout=subprocess.DEVNULL)
+                startup[label] = round(time.perf_counter() - start, 3)
+
+            # Mediciones en un proceso limpio (caché de indices ya construido)
+            addition_labels = [label for label in labels if ADDITION_QUERY in label][:args.addition_names]
+            with FakeEndpoint(addition_labels, args.sparql_latency / 1000) as endpoint:
+                env.update(DBPEDIA_ENDPOINT=endpoint.url, TRANSLATION_OFFLINE='0', SPARQL_CACHE_TTL='0')
+                output = workdir/"result.json"
+                subprocess.run([sys.executable, __file__, '--child', str(output)] + _child_args(args),
+                               cwd=HERE, env=env, check=True, stdout=subprocess.DEVNULL)
+                with open(output, encoding='utf-8') as f:
+                    report['scales'][str(scale)] = dict(startup, **json.load(f))
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Resultados en {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+def _child_args(args):
+    return ['--iterations', str(args.iterations), '--class-iterations', str(args.class_iterations),
+            '--classes', str(args.classes), '--additions', str(args.additions), '--seed', str(args.seed),
+            '--translate-latency', str(args.translate_latency)]
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de la API de ontologia')
+    parser.add_argument('--scales', default='1,10,100', help='factores de escala de la ontologia, separados por coma')
+    parser.add_argument('--iterations', type=int, default=200, help='consultas por medicion de busqueda')
+    parser.add_argument('--class-iterations', type=int, default=20, help='llamadas por clase a getInstancesByClass')
+    parser.add_argument('--classes', type=int, default=3, help='cantidad de clases mas grandes a medir')
+    parser.add_argument('--additions', type=int, default=3, help='llamadas a /addition (storeData)')
+    parser.add_argument('--addition-names', type=int, default=40, help='nombres devueltos por el SPARQL falso')
+    parser.add_argument('--diseases', type=int, default=2000, help='enfermedades del snapshot DBPedia por unidad de escala')
+    parser.add_argument('--translate-latency', type=float, default=0, help='ms por llamada a la traduccion falsa')
+    parser.add_argument('--sparql-latency', type=float, default=0, help='ms por consulta al SPARQL falso')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='archivo JSON de resultados (por defecto stdout)')
+    parser.add_argument('--keep', action='store_true', help='conservar los directorios temporales')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.child:
+        results = run_scale(args)
+        with open(args.child, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+    else:
+        run_parent(args)
@@ -0,0 +1,174 @@
+from threading import Lock
+
+from owlready2 import ThingClass
+
+from lru import LRUCache
+import metrics
+from translator import translate
+from preprocess import normalize
+
+"""
+CATALOGO DE CLASES
+
+Se arma una sola vez por version de la ontologia (ontology.version()):
+
+    nombre -> clase, y claves normalizadas (minusculas, sin tildes, '_' = ' ')
+    de nombres y rdfs:label -> nombre
+    arbol de jerarquia (mismo formato que restructure.struct_class)
+    clausuras de ancestros y descendientes
+    cantidad de instancias directas y totales (con subclases) por clase
+
+Resolver un nombre de /searchClass es una consulta a un dict: exacto, luego
+normalizado y, si no existe, el nombre traducido al español (caché de
+traducciones), sin recorrer los atributos de la ontologia.
+"""
+
+_catalogue = None
+_lock = Lock()
+# Nombre pedido -> nombre de la clase (o None), por version del catalogo
+_resolved = LRUCache(4096)
+metrics.register_cache('class_catalogue', _resolved.stats)
+
+class ClassCatalogue:
+    """
+    Class lookup tables, hierarchy and instance counts of one ontology version.
+
+    Parameters:
+        ontologie: Loaded owlready2 ontology.
+        version: ontology.version() the catalogue was built from.
+    """
+
+    def __init__(self, ontologie, version):
+        self.ontologie = ontologie
+        self.version = version
+        self.classes = {}
+        for class_ in ontologie.classes():
+            self.classes.setdefault(class_.name, class_)
+
+        self._keys = {}
+        for name, class_ in self.classes.items():
+            for alias in [name] + [str(label) for label in class_.label]:
+                self._keys.setdefault(normalize(alias), name)
+
+        # Jerarquia directa (incluye subclases inferidas si hay snapshot de inferencias)
+        self.parents = {name: [] for name in self.classes}
+        self.children = {name: [] for name in self.classes}
+        for name, class_ in self.classes.items():
+            for parent in class_.is_a:
+                if isinstance(parent, ThingClass) and parent.name in self.classes and parent.name != name:
+                    self.parents[name].append(parent.name)
+                    self.children[parent.name].append(name)
+        self.roots = sorted(name for name, parents in self.parents.items() if not parents)
+
+        self.ancestors = {}
+        self.descendants = {}
+        for name in self.classes:
+            self.ancestors[name] = self._closure(name, self.parents, self.ancestors)
+            self.descendants[name] = self._closure(name, self.children, self.descendants)
+
+        # Instancias directas por clase; las totales suman las de los descendientes sin repetir
+        members = {name: set() for name in self.classes}
+        for individual in ontologie.individuals():
+            for class_ in individual.is_a:
+                if isinstance(class_, ThingClass) and class_.name in members:
+                    members[class_.name].add(individual.storid)
+        self.instances = {name: len(storids) for name, storids in members.items()}
+        self.instances_total = {
+            name: len(members[name].union(*(members[descendant] for descendant in self.descendants[name])))
+            for name in self.classes
+        }
+        self._tree = None
+
+    def _closure(self, name, edges, memo):
+        if name in memo:
+            return memo[name]
+        memo[name] = frozenset()  # corta ciclos (clases equivalentes)
+        reached = set()
+        for other in edges[name]:
+            reached.add(other)
+            reached |= self._closure(other, edges, memo)
+        reached.discard(name)
+        memo[name] = frozenset(reached)
+        return memo[name]
+
+    def __len__(self):
+        return len(self.classes)
+
+    def get(self, name):
+        """Class with exactly this name, or None"""
+        return self.classes.get(name)
+
+    def lookup(self, name):
+        """Class name matching `name` ignoring case, accents and '_' vs ' ' (or a label), or None"""
+        if name in self.classes:
+            return name
+        return self._keys.get(normalize(name))
+
+    def tree(self):
+        """
+        Full hierarchy as nested {'name_class', 'sub_class'} dicts, from the roots.
+        """
+        if self._tree is None:
+            def build(name, path):
+                return [{'name_class': child, 'sub_class': build(child, path | {child})}
+                        for child in sorted(self.children[name]) if child not in path]
+            self._tree = [{'name_class': root, 'sub_class': build(root, {root})} for root in self.roots]
+        return self._tree
+
+    def describe(self, name):
+        """
+        Catalogue entry of a class: parents, children, closures and instance counts.
+        """
+        return {
+            'name': name,
+            'iri': self.classes[name].iri,
+            'parents': sorted(self.parents[name]),
+            'children': sorted(self.children[name]),
+            'ancestors': sorted(self.ancestors[name]),
+            'descendants': sorted(self.descendants[name]),
+            'instances': self.instances[name],
+            'instances_total': self.instances_total[name],
+        }
+
+def get_catalogue(ontologie, version):
+    """
+    Catalogue of an ontology, rebuilt when the ontology object (reload) or its version changes.
+    """
+    global _catalogue
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.ontologie is ontologie and catalogue.version == version:
+        return catalogue
+    with _lock:
+        if _catalogue is None or _catalogue.ontologie is not ontologie or _catalogue.version != version:
+            with metrics.span('class_catalogue'):
+                _catalogue = ClassCatalogue(ontologie, version)
+        return _catalogue
+
+def resolve(catalogue, name):
+    """
+    Class name for a user-supplied name: exact, case/accent-insensitive,
+    rdfs:label, or translated to Spanish (the ontology language).
+
+    Returns:
+        str | None: Name of the class, or None if nothing matches.
+    """
+    if name in catalogue.classes:
+        return name
+    key = (id(catalogue.ontologie), catalogue.version, name)
+    resolved = _resolved.get(key, False)
+    if resolved is False:
+        resolved = catalogue.lookup(name)
+        if resolved is None:
+            # "Lung cancer", "Herbal remedy"...: traducir solo cuando no hay coincidencia local
+            resolved = catalogue.lookup(translate(name, dest='es'))
+        _resolved.set(key, resolved)
+    return resolved
+
+def invalidate():
+    """
+    Drop the catalogue, e.g. after the ontology is modified.
+    """
+    global _catalogue
+    with _lock:
+        _catalogue = None
+        _resolved.clear()
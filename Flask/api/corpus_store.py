@@ -0,0 +1,453 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import multiprocessing
+from bisect import bisect_left
+from itertools import repeat
+from threading import Lock
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+import index_cache
+from ngram_index import NGramIndex
+from search_engine import SearchEngine
+
+"""
+CORPUS DE BUSQUEDA EN DISCO (SOLO LECTURA, MAPEADO EN MEMORIA)
+
+Para servir con varios procesos: el proceso padre escribe una vez cada motor
+de busqueda en un formato compacto y cada worker lo abre con mmap. Las
+paginas las comparte el sistema operativo entre todos los procesos, en vez
+de que cada uno tenga su propia copia de listas y diccionarios de Python.
+
+Cada motor se escribe en un directorio inmutable
+{nombre}-v{version}-{hash}-{build}.store del caché de indices, y el archivo
+{nombre}-v{version}-{hash}.current indica cual es el vigente. Publicar un
+motor nuevo es escribir otro directorio y reemplazar .current (os.replace),
+asi los procesos que tienen mapeado el anterior no se ven afectados. Solo
+el proceso constructor de serve.py (SEARCH_STORE=build) borra directorios
+viejos; los workers nunca borran nada.
+
+Formato de cada directorio:
+
+    corpus.bin / corpus.idx.npy       textos normalizados (UTF-8 concatenado + offsets)
+    payloads.bin / payloads.idx.npy   payloads en JSON
+    keys.bin / keys.idx.npy           claves en JSON (para add/remove)
+    grams.bin / grams.idx.npy         n-gramas ordenados
+    postings.npy / postings.idx.npy   posiciones de cada n-grama (CSR, int32)
+    meta.json                         parametros del motor
+
+Las adiciones de un worker quedan en memoria de ese worker, como una capa
+chica (_Overlay) sobre el corpus mapeado; los demas las ven cuando el
+constructor vuelve a publicar el motor (la adicion lo marca como
+desactualizado) o tras una recarga.
+
+Se activa con SEARCH_STORE=1 (lo hace serve.py en los workers).
+"""
+
+ENABLED = os.environ.get('SEARCH_STORE', '0') in ('1', 'build')
+# Proceso constructor: reconstruye motores desactualizados y borra los viejos
+BUILDER = os.environ.get('SEARCH_STORE', '0') == 'build'
+
+class MappedStrings(Sequence):
+    """
+    Read-only sequence of strings stored as a UTF-8 arena plus offsets,
+    decoded on access.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self._offsets = np.load(os.path.join(directory, f"{name}.idx.npy"), mmap_mode='r')
+        with open(os.path.join(directory, f"{name}.bin"), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap no acepta archivos vacios
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+        if isinstance(i, np.ndarray):
+            return self.take(i)
+        if i < 0:
+            i += len(self)
+        return self.decode(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __iter__(self):
+        return iter(self.take(range(len(self))))
+
+    def take(self, positions):
+        """
+        Decode several entries at once (offsets read as one numpy gather).
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        blob, decode = self._blob, self.decode
+        return [decode(blob[start:end]) for start, end in
+                zip(self._offsets[positions].tolist(), self._offsets[positions + 1].tolist())]
+
+    def edited(self, removed=(), appended=(), empty=None):
+        # Las mutaciones de SearchEngine quedan en una capa en memoria (solo en ese proceso)
+        return _Overlay(self).edited(removed, appended, empty)
+
+    def local_mask(self, positions):
+        """Positions that are not read from the mapped files (none)"""
+        return np.zeros(len(positions), dtype=bool)
+
+    def decode(self, raw):
+        return raw.decode('utf-8')
+
+class _Overlay(Sequence):
+    """
+    Mapped sequence plus the entries added (`tail`) and blanked (`blanked`,
+    position -> empty value) in this process. Edits copy only the overlay.
+    """
+
+    def __init__(self, base, tail=(), blanked=None):
+        self.base = base
+        self.directory = base.directory
+        self.tail = list(tail)
+        self.blanked = dict(blanked or {})
+
+    def __len__(self):
+        return len(self.base) + len(self.tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+        if isinstance(i, np.ndarray):
+            return self.take(i)
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if i in self.blanked:
+            return self.blanked[i]
+        if i < len(self.base):
+            return self.base[i]
+        return self.tail[i - len(self.base)]
+
+    def __iter__(self):
+        return iter(self.take(range(len(self))))
+
+    def take(self, positions):
+        positions = np.asarray(positions, dtype=np.intp)
+        local = self.local_mask(positions)
+        if not local.any():
+            return self.base.take(positions)
+        values = self.base.take(positions[~local])
+        merged = iter(values)
+        return [self[i] if is_local else next(merged) for i, is_local in zip(positions.tolist(), local.tolist())]
+
+    def local_mask(self, positions):
+        """Positions whose value lives in the overlay instead of the mapped files"""
+        positions = np.asarray(positions, dtype=np.intp)
+        local = positions >= len(self.base)
+        if self.blanked:
+            local |= np.isin(positions, list(self.blanked))
+        return local
+
+    def edited(self, removed=(), appended=(), empty=None):
+        overlay = _Overlay(self.base, self.tail + list(appended), self.blanked)
+        for position in removed:
+            if position < len(self.base):
+                overlay.blanked[position] = empty
+            else:
+                overlay.tail[position - len(self.base)] = empty
+        return overlay
+
+class MappedJSON(MappedStrings):
+    """
+    Read-only sequence of JSON values (payloads, keys).
+    """
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+class MappedNGramIndex(NGramIndex):
+    """
+    NGramIndex over CSR postings mapped from disk.
+
+    Entries added after opening are indexed in memory; removed positions are
+    filtered out of the mapped postings.
+    """
+
+    def __init__(self, directory, n, size):
+        self.n = n
+        self.size = size
+        self._grams = MappedStrings(directory, 'grams')
+        self._offsets = np.load(os.path.join(directory, 'postings.idx.npy'), mmap_mode='r')
+        self._positions = np.load(os.path.join(directory, 'postings.npy'), mmap_mode='r')
+        self._postings = {}
+        self._removed = set()
+
+    def postings(self, gram: str):
+        found = self._postings.get(gram, ())
+        row = bisect_left(self._grams, gram)
+        if row < len(self._grams) and self._grams[row] == gram:
+            mapped = self._positions[self._offsets[row]:self._offsets[row + 1]]
+            if self._removed:
+                mapped = mapped[~np.isin(mapped, list(self._removed))]
+            found = np.concatenate([mapped, np.asarray(found, dtype=mapped.dtype)]) if found else mapped
+        return found
+
+    def remove(self, position: int, text: str):
+        super().remove(position, text)
+        self._removed.add(position)
+
+def _base(name, source_path):
+    return index_cache.cache_file(name, source_path)[:-len('.pkl')]
+
+def current_store(name, source_path):
+    """
+    Directory of the published store of a component for the current content
+    of `source_path`, or None.
+    """
+    try:
+        with open(_base(name, source_path) + '.current', encoding='utf-8') as f:
+            directory = os.path.join(index_cache.CACHE_DIR, f.read().strip())
+    except FileNotFoundError:
+        return None
+    return directory if os.path.exists(os.path.join(directory, 'meta.json')) else None
+
+def publish(engine, name, source_path):
+    """
+    Write an engine to a new store directory and make it the current one (atomically).
+
+    Returns:
+        str: The new store directory.
+    """
+    base = _base(name, source_path)
+    directory = f"{base}-{int(time.time() * 1000)}-{os.getpid()}.store"
+    write(engine, directory)
+    pointer = f"{base}.current.{os.getpid()}.tmp"
+    with open(pointer, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(directory))
+    os.replace(pointer, base + '.current')
+    try:
+        os.remove(base + '.stale')
+    except FileNotFoundError:
+        pass
+    return directory
+
+def mark_stale(name, source_path):
+    """
+    Flag the current store of a component as outdated (e.g. after an
+    addition with the sqlite backend, where the source file does not
+    change). The constructor rebuilds it; workers keep using it.
+    """
+    os.makedirs(index_cache.CACHE_DIR, exist_ok=True)
+    with open(_base(name, source_path) + '.stale', 'w'):
+        pass
+
+def is_stale(name, source_path):
+    return os.path.exists(_base(name, source_path) + '.stale')
+
+@contextmanager
+def _exclusive(path):
+    # Un solo proceso construye cada motor; los demas esperan y abren el publicado
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: serve.py usa un solo proceso
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def write(engine, directory):
+    """
+    Write a SearchEngine in the mapped format (atomically: tmp dir + rename).
+    """
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    keys = [None] * len(engine.corpus)
+    for key, position in engine._positions.items():
+        keys[position] = key
+    write_strings(tmp, 'corpus', engine.corpus)
+    write_strings(tmp, 'payloads', [json.dumps(payload, ensure_ascii=False) for payload in engine.payloads])
+    write_strings(tmp, 'keys', [json.dumps(key, ensure_ascii=False) for key in keys])
+
+    grams = sorted(engine.ngrams._postings)
+    write_strings(tmp, 'grams', grams)
+    lengths = [len(engine.ngrams._postings[gram]) for gram in grams]
+    np.save(os.path.join(tmp, 'postings.idx.npy'), np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]))
+    positions = [position for gram in grams for position in engine.ngrams._postings[gram]]
+    np.save(os.path.join(tmp, 'postings.npy'), np.asarray(positions, dtype=np.int32))
+
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'score_cutoff': engine.score_cutoff,
+            'workers': engine.workers,
+            'min_overlap': engine.min_overlap,
+            'prefilter_min_size': engine.prefilter_min_size,
+            'n': engine.ngrams.n,
+            'live': len(engine)
+        }, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+def write_strings(directory, name, strings):
+    """
+    Write strings as `{name}.bin` (UTF-8 arena) and `{name}.idx.npy` (offsets), readable with MappedStrings.
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+        for raw in encoded:
+            f.write(raw)
+    offsets = np.concatenate([[0], np.cumsum([len(raw) for raw in encoded], dtype=np.int64)])
+    np.save(os.path.join(directory, f"{name}.idx.npy"), offsets.astype(np.int64))
+
+def open_engine(directory):
+    """
+    SearchEngine backed by a store written with write().
+    """
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    corpus = MappedStrings(directory, 'corpus')
+    engine = SearchEngine.__new__(SearchEngine)
+    engine.__setstate__({
+        'score_cutoff': meta['score_cutoff'],
+        'workers': meta['workers'],
+        'min_overlap': meta['min_overlap'],
+        'prefilter_min_size': meta['prefilter_min_size'],
+        '_entries': (corpus, MappedJSON(directory, 'payloads')),
+        'ngrams': MappedNGramIndex(directory, meta['n'], len(corpus)),
+        '_positions': _LazyPositions(MappedJSON(directory, 'keys'), meta['live']),
+        'store_path': directory
+    })
+    return engine
+
+def mapped_store(engine):
+    """
+    Store directory of an engine opened with open_engine() and not edited
+    since (no local additions or removals), or None.
+    """
+    return engine.store_path if isinstance(engine.corpus, MappedStrings) else None
+
+class _LazyPositions(dict):
+    """
+    key -> position map that is only materialized when first needed
+    (add/remove/contains), so read-only workers never build it.
+    """
+
+    def __init__(self, keys, live):
+        super().__init__()
+        self._keys = keys
+        self._live = live
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            for position, key in enumerate(self._keys):
+                if key is not None:
+                    dict.__setitem__(self, key, position)
+
+    def __len__(self):
+        return dict.__len__(self) if self._loaded else self._live
+
+    def __contains__(self, key):
+        self._load()
+        return dict.__contains__(self, key)
+
+    def __setitem__(self, key, value):
+        self._load()
+        dict.__setitem__(self, key, value)
+
+    def pop(self, key, *default):
+        self._load()
+        return dict.pop(self, key, *default)
+
+    def items(self):
+        self._load()
+        return dict.items(self)
+
+# Pool de procesos para el puntaje (se crea en el primer uso, en cada worker)
+_pool = None
+_pool_lock = Lock()
+# Corpus ya mapeados dentro de cada proceso del pool
+_shard_corpora = {}
+
+def score_in_pool(corpus, query, ids, score_cutoff, processes):
+    """
+    Score a query against the positions `ids` of a mapped corpus, split in
+    one shard per pool process. Positions added or blanked in this process
+    (an _Overlay) are scored here.
+
+    Returns:
+        numpy.ndarray: scores aligned with `ids`.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no hereda threads ni locks del worker de Flask
+            _pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+    ids = np.asarray(ids)
+    local = corpus.local_mask(ids)
+    shards = np.array_split(ids[~local], processes)
+    scores = np.empty(len(ids), dtype=np.float32)
+    scores[~local] = np.concatenate(list(_pool.map(_score_shard, repeat(corpus.directory), repeat(query), shards,
+                                                   repeat(score_cutoff))))
+    if local.any():
+        scores[local] = process.cdist([query], corpus.take(ids[local]), scorer=fuzz.partial_ratio,
+                                      score_cutoff=score_cutoff, workers=1)[0]
+    return scores
+
+def _score_shard(directory, query, ids, score_cutoff):
+    corpus = _shard_corpora.get(directory)
+    if corpus is None:
+        corpus = _shard_corpora[directory] = MappedStrings(directory, 'corpus')
+    if not len(ids):
+        return np.empty(0, dtype=np.float32)
+    return process.cdist([query], corpus.take(ids), scorer=fuzz.partial_ratio,
+                         score_cutoff=score_cutoff, workers=1)[0]
+
+def load_or_build(name, source_path, build):
+    """
+    Mapped SearchEngine for `source_path`. The store is built (from the
+    pickled index cache, or by calling `build`) and published if there is
+    none yet, and in the constructor also if it was marked as stale.
+    """
+    base = _base(name, source_path)
+    directory = current_store(name, source_path)
+    if directory is None or (BUILDER and is_stale(name, source_path)):
+        with _exclusive(base + '.lock'):
+            # Otro proceso pudo publicarlo mientras se esperaba el lock
+            directory = current_store(name, source_path)
+            if directory is None or (BUILDER and is_stale(name, source_path)):
+                engine = index_cache.load_or_build(name, source_path, build)
+                directory = publish(engine, name, source_path)
+    if BUILDER:
+        remove_old(name, directory)
+    return open_engine(directory)
+
+def remove_old(name, keep):
+    """
+    Remove the stores of a component other than `keep`, and the pointers of
+    older sources (constructor only: workers may still have them mapped).
+    """
+    # {base}-{build}.store -> {base}
+    base = os.path.basename(keep)[:-len('.store')].rsplit('-', 2)[0]
+    for entry in os.listdir(index_cache.CACHE_DIR):
+        if not entry.startswith(f"{name}-v"):
+            continue
+        path = os.path.join(index_cache.CACHE_DIR, entry)
+        if entry.endswith('.store') and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.endswith(('.current', '.stale')) and not entry.startswith(base + '.'):
+            os.remove(path)
@@ -1,38 +1,21 @@
-from rdflib import Graph, RDF, URIRef
-from SPARQLWrapper import SPARQLWrapper, XML, JSON
-from xml.etree import ElementTree
+import os
+from threading import Lock
 
-from preprocess import preprocess, match
+from search_engine import SearchEngine
+from payload_table import PayloadTable
 from ontology import store_in_ontology
+from sparql_client import client, literal
+import dbpedia_snapshot
+import index_cache
+import corpus_store
 
-"""
-IMPORT DISEASE ONTOLOGY
-"""
-sparql = SPARQLWrapper("http://dbpedia.org/sparql")
-sparql.setReturnFormat(XML)
-sparql.setQuery("""
-    select distinct ?disease where {
-        ?disease rdf:type dbo:Disease .
-    }
-    limit 500
-""")
-
-results = sparql.query().convert()
-graph = Graph()
-
-root = ElementTree.fromstring(results.toxml())
-
-"""DELETE ALL DUPLICATED INSTANCES"""
-for result in root.findall(".//{http://www.w3.org/2005/sparql-results#}result"):
-    uri = result.find(".//{http://www.w3.org/2005/sparql-results#}uri")
-    if uri is not None:
-        disease_uri = URIRef(uri.text)
-        graph.add((disease_uri, RDF.type, URIRef("http://dbpedia.org/ontology/Disease")))
+# Segundos entre refrescos del snapshot de enfermedades (0 = desactivado)
+REFRESH_INTERVAL = int(os.environ.get('DBPEDIA_REFRESH_INTERVAL', 0))
+# Nombres por consulta VALUES en /addition (limite de tamaño de consulta del endpoint)
+STORE_BATCH_SIZE = int(os.environ.get('DBPEDIA_STORE_BATCH_SIZE', 20))
 
 def verificate_name(name_search):
-    sparql.setReturnFormat(JSON)
-
-    sparql.setQuery(f"""
+    bindings = client.select(f"""
         PREFIX dbo: <http://dbpedia.org/ontology/>
         PREFIX dbr: <http://dbpedia.org/resource/>
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -46,7 +29,7 @@ def verificate_name(name_search):
         }}
             
     """)
-    results = [bind["name"]["value"] for bind in sparql.query().convert()['results']['bindings']]
+    results = [bind["name"]["value"] for bind in bindings]
 
     result_query = []
     for name in results:
@@ -62,44 +45,98 @@ def verificate_name(name_search):
 
 # Pre-construir índice de DBPedia
 _dbpedia_index = None
+# Sube cada vez que se reemplaza el índice (invalida las respuestas cacheadas)
+_index_version = 0
+# Protege la primera construccion y el reemplazo del índice
+_index_lock = Lock()
+# Una sola recarga a la vez
+_reload_lock = Lock()
+
+def version():
+	"""Contador que cambia con cada recarga del índice de DBPedia"""
+	return _index_version
 
 def build_dbpedia_index():
-	"""Construye índice de DBPedia una sola vez"""
+	"""Carga desde el caché en disco, o construye, el índice de DBPedia a partir del snapshot local"""
 	global _dbpedia_index
-	if _dbpedia_index is not None:
-		return _dbpedia_index
-
-	_dbpedia_index = []
-	for iri, predicate, obj in graph.triples((None, RDF.type, None)):
-		name = preprocess(str(iri).split('/')[-1])
-		_dbpedia_index.append({'iri': str(iri), 'name': name})
-
-	print(f"Índice DBPedia construido con {len(_dbpedia_index)} enfermedades")
-	return _dbpedia_index
+	index = _dbpedia_index
+	if index is None:
+		with _index_lock:
+			if _dbpedia_index is None:
+				_dbpedia_index = _load_dbpedia_index()
+				print(f"Índice DBPedia construido con {len(_dbpedia_index)} enfermedades")
+			index = _dbpedia_index
+	return index
+
+def _load_dbpedia_index():
+	load_or_build = corpus_store.load_or_build if corpus_store.ENABLED else index_cache.load_or_build
+	return load_or_build('dbpedia_index', dbpedia_snapshot.SNAPSHOT_PATH, _build_dbpedia_index)
+
+def _build_dbpedia_index():
+	diseases = dbpedia_snapshot.load_snapshot()
+	if not diseases:
+		print(f"Snapshot de DBPedia no encontrado en {dbpedia_snapshot.SNAPSHOT_PATH}, "
+			  "generarlo con: python dbpedia_snapshot.py")
+
+	entries = PayloadTable(({'iri': disease['iri'], 'name': disease['name']} for disease in diseases),
+						   fields=('iri', 'name'), iris=('iri',))
+	return SearchEngine([disease['name'] for disease in diseases], entries)
+
+def reload_dbpedia_index():
+	"""Reconstruye el índice desde el snapshot y lo reemplaza de una sola vez"""
+	global _dbpedia_index, _index_version
+	with _reload_lock:
+		# Las búsquedas siguen usando el índice anterior mientras se construye el nuevo
+		index = _load_dbpedia_index()
+		with _index_lock:
+			_dbpedia_index = index
+			_index_version += 1
+	print(f"Índice DBPedia recargado con {len(index)} enfermedades")
+	return index
+
+if corpus_store.BUILDER and not os.path.exists(dbpedia_snapshot.SNAPSHOT_PATH):
+	# El constructor de serve.py genera el snapshot antes de escribir el corpus compartido
+	try:
+		dbpedia_snapshot.build_snapshot()
+	except Exception as e:
+		print(f"No se pudo generar el snapshot de DBPedia: {e}")
 
 # Construir al cargar
 build_dbpedia_index()
 
-def searchDBPedia(query):
-	"""Búsqueda optimizada con índice pre-construido"""
-	results = []
+if REFRESH_INTERVAL:
+	dbpedia_snapshot.start_refresh(REFRESH_INTERVAL, reload_dbpedia_index)
+elif not os.path.exists(dbpedia_snapshot.SNAPSHOT_PATH) and not corpus_store.ENABLED:
+	# Sin snapshot: generarlo una vez sin demorar el arranque (los workers de serve.py usan el del constructor)
+	dbpedia_snapshot.build_in_background(reload_dbpedia_index)
+
+def searchDBPedia(query, limit=None, offset=0, fields=None):
+	"""Búsqueda rankeada con índice pre-construido, opcionalmente proyectada a `fields`"""
 	index = build_dbpedia_index()
+	return _project(index.search(query, limit=limit, offset=offset), fields)
 
-	for entry in index:
-		if match(entry['name'], query) >= 50.0:
-			results.append({'iri': entry['iri'], 'name': entry['name']})
+def searchDBPediaBatch(queries, limit=None, offset=0, fields=None):
+	"""Búsqueda rankeada de muchas queries con una sola pasada de puntaje (query x corpus)"""
+	index = build_dbpedia_index()
+	return [_project(hits, fields) for hits in index.search_many(queries, limit=limit, offset=offset)]
 
+def _project(hits, fields):
+	results = [dict(entry, score=score) for entry, score in hits]
+	if fields is not None:
+		results = [{key: value for key, value in result.items() if key in fields} for result in results]
 	return results
 
+def status():
+	"""Componentes de DBPedia ya cargados en memoria"""
+	return {'dbpedia_index': _dbpedia_index is not None}
+
 def searchDBPediaOnline(query, lang='es'):
     """
     BÚSQUEDA ONLINE: Consulta SPARQL en tiempo real a DBPedia.
     Busca enfermedades relacionadas con oncología que coincidan con la query.
     """
-    sparql.setReturnFormat(JSON)
-
     # Buscar primero en inglés (DBPedia tiene más datos en inglés)
-    sparql.setQuery(f"""
+    sparql_query = f"""
         PREFIX dbo: <http://dbpedia.org/ontology/>
         PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 
@@ -108,7 +145,7 @@ def searchDBPediaOnline(query, lang='es'):
             ?disease rdf:type dbo:Disease ;
                      rdfs:label ?nameEn .
             FILTER(lang(?nameEn) = "en")
-            FILTER(CONTAINS(LCASE(?nameEn), LCASE("{query}")))
+            FILTER(CONTAINS(LCASE(?nameEn), LCASE({literal(query)})))
 
             OPTIONAL {{
                 ?disease rdfs:label ?nameEs .
@@ -120,12 +157,13 @@ def searchDBPediaOnline(query, lang='es'):
             }}
         }}
         LIMIT 15
-    """)
+    """
 
     try:
-        results = sparql.query().convert()
+        # Consultas identicas dentro del TTL se sirven desde el caché del cliente
+        bindings = client.select(sparql_query)
         diseases = []
-        for binding in results['results']['bindings']:
+        for binding in bindings:
             # Preferir nombre en español si existe
             name = binding.get('nameEs', binding.get('nameEn', {})).get('value', 'Sin nombre')
             abstract_text = binding.get('abstract', {}).get('value', 'Sin descripción disponible')
@@ -143,26 +181,24 @@ def searchDBPediaOnline(query, lang='es'):
         return []
 
 def storeData(entity_type, lang):
-    sparql.setReturnFormat(JSON)
-
     names = verificate_name(entity_type)
 
     if type(names) == dict:
         return names
 
-    results = []
-
-    for name in names :
-        sparql.setQuery(f"""
+    # Un solo VALUES por bloque de nombres, bloques consultados en paralelo
+    chunks = [names[i:i + STORE_BATCH_SIZE] for i in range(0, len(names), STORE_BATCH_SIZE)]
+    queries = [f"""
             PREFIX dbo: <http://dbpedia.org/ontology/>
             PREFIX dbr: <http://dbpedia.org/resource/>
             PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
             PREFIX dct: <http://purl.org/dc/terms/>
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
 
-            SELECT DISTINCT ?entity (SAMPLE(?n) as ?name) (SAMPLE(?c) as ?comment) ?type
+            SELECT DISTINCT ?label ?entity (SAMPLE(?n) as ?name) (SAMPLE(?c) as ?comment) ?type
             WHERE {{
-                ?entity rdfs:label "{name}"@en ;
+                VALUES ?label {{ {' '.join(literal(name, 'en') for name in chunk)} }}
+                ?entity rdfs:label ?label ;
                         rdfs:label ?n ;
                         rdfs:comment ?c .
                 ?entity rdf:type ?typeClass .
@@ -174,9 +210,14 @@ def storeData(entity_type, lang):
                 OPTIONAL{{ FILTER(lang(?c) = "{lang}") }}
                 OPTIONAL{{ FILTER(lang(?c) = "en") }}
             }}
-            """)
+            GROUP BY ?label ?entity ?type
+            """ for chunk in chunks]
+
+    # Primer resultado de cada nombre, en el orden de verificate_name
+    first_by_name = {}
+    for bindings in client.select_many(queries):
+        for binding in bindings:
+            first_by_name.setdefault(binding['label']['value'], binding)
+    results = [first_by_name[name] for name in names if name in first_by_name]
 
-        result = sparql.query().convert()["results"]["bindings"]
-        if len(result) > 0:
-            results.append(result[0])
-    store_in_ontology(results, entity_type)
+    return store_in_ontology(results, entity_type)
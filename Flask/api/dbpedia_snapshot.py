@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+
+from preprocess import preprocess_batch
+from sparql_client import client
+
+"""
+SNAPSHOT LOCAL DE ENFERMEDADES DE DBPEDIA
+
+Genera (python dbpedia_snapshot.py) un archivo JSON lines con una enfermedad
+por linea: {"iri", "label", "name"}, donde "name" ya esta pre-procesado.
+Al iniciar la API el indice se carga directamente desde este archivo; si
+no existe, la API lo genera en segundo plano (hace falta acceso al endpoint)
+y mientras tanto DBPedia no da resultados offline.
+"""
+
+SNAPSHOT_PATH = os.environ.get(
+    'DBPEDIA_SNAPSHOT_PATH',
+    str(Path(__file__).parent.resolve().parent.parent/"resourse/dbpedia_diseases.jsonl")
+)
+# El endpoint publico de DBPedia corta las respuestas en 10000 filas
+PAGE_SIZE = 10000
+
+def fetch_diseases(page_size=PAGE_SIZE):
+    """
+    Page through every dbo:Disease of the endpoint.
+
+    Yields
+    ------
+    tuple[str, str]
+        (iri, english label or '')
+    """
+    offset = 0
+    while True:
+        bindings = client.select(f"""
+            PREFIX dbo: <http://dbpedia.org/ontology/>
+            PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+
+            SELECT ?disease (SAMPLE(?l) AS ?label)
+            WHERE {{
+                ?disease rdf:type dbo:Disease .
+                OPTIONAL {{
+                    ?disease rdfs:label ?l .
+                    FILTER(lang(?l) = "en")
+                }}
+            }}
+            GROUP BY ?disease
+            ORDER BY ?disease
+            LIMIT {page_size}
+            OFFSET {offset}
+        """, cache=False)
+        for binding in bindings:
+            yield binding['disease']['value'], binding.get('label', {}).get('value', '')
+        if len(bindings) < page_size:
+            break
+        offset += page_size
+
+def build_snapshot(path=SNAPSHOT_PATH, page_size=PAGE_SIZE):
+    """
+    Download the diseases, preprocess their names and write the snapshot file atomically.
+
+    Returns
+    -------
+    int
+        number of diseases written
+    """
+    diseases = list(fetch_diseases(page_size))
+    names = preprocess_batch([iri.split('/')[-1] for iri, label in diseases])
+
+    # Archivo temporal por proceso: varios workers pueden generarlo a la vez
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for (iri, label), name in zip(diseases, names):
+            f.write(json.dumps({'iri': iri, 'label': label, 'name': name}, ensure_ascii=False) + '\n')
+    os.replace(tmp, path)
+    return len(diseases)
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """
+    Read the snapshot file.
+
+    Returns
+    -------
+    list[dict]
+        one {'iri', 'label', 'name'} dict per disease, empty if the file does not exist
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def start_refresh(interval, on_refresh, path=SNAPSHOT_PATH):
+    """
+    Rebuild the snapshot every `interval` seconds in a daemon thread and call
+    `on_refresh()` after each successful rebuild. A missing snapshot is
+    built right away.
+    """
+    def refresh():
+        wait = interval if os.path.exists(path) else 0
+        while True:
+            time.sleep(wait)
+            wait = interval
+            try:
+                build_snapshot(path)
+                on_refresh()
+            except Exception as e:
+                print(f"Error al refrescar el snapshot de DBPedia: {e}")
+
+    thread = threading.Thread(target=refresh, name='dbpedia-snapshot-refresh', daemon=True)
+    thread.start()
+    return thread
+
+def build_in_background(on_build, path=SNAPSHOT_PATH):
+    """
+    Build the snapshot once in a daemon thread and call `on_build()` after it.
+    """
+    def build():
+        try:
+            count = build_snapshot(path)
+            print(f"Snapshot de DBPedia generado con {count} enfermedades en {path}")
+            on_build()
+        except Exception as e:
+            print(f"No se pudo generar el snapshot de DBPedia: {e}")
+
+    thread = threading.Thread(target=build, name='dbpedia-snapshot-build', daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == '__main__':
+    # python dbpedia_snapshot.py [archivo] [tamaño de pagina]
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else PAGE_SIZE
+    start = time.perf_counter()
+    count = build_snapshot(path, page_size)
+    print(f"Snapshot con {count} enfermedades guardado en {path} ({time.perf_counter() - start:.1f}s)")
@@ -0,0 +1,298 @@
+import re
+from threading import Lock
+
+from owlready2 import ThingClass, ObjectPropertyClass, DataPropertyClass
+
+from lru import LRUCache
+import metrics
+from restructure import getNombreProp
+
+"""
+CONSULTAS DL (SUBCONJUNTO MANCHESTER)
+
+Responde las preguntas de competencia del README sin razonador:
+
+    Centro_medico that ofreceTratamiento some (Tratamiento_Medico that combate some
+        (Cancer and cancer_nombre value "Cancer de pulmon"))
+
+La consulta se compila a un plan (tuplas anidadas) y se evalua con operaciones
+de conjuntos sobre indices precalculados: extension de cada clase, cada
+propiedad de objeto en ambos sentidos y valores de propiedades de datos.
+Solo se usan los hechos declarados (mundo cerrado): `P only C` son los
+individuos con algun valor de P y todos ellos en C.
+
+Gramatica soportada:
+
+    expr   := and_expr ('or' and_expr)*
+    and    := atom (('and' | 'that') atom)*
+    atom   := '(' expr ')' | CLASE
+            | ['inverse'] PROP ('some' | 'only') atom
+            | PROP 'value' ("literal" | INDIVIDUO)
+"""
+
+# Propiedades que el README usa pero la ontologia no declara: nombre -> propiedad inversa
+INVERSE_ALIASES = {
+    'esAfectadoPor': 'afectaOrgano',
+}
+KEYWORDS = {'that', 'and', 'or', 'some', 'only', 'value', 'inverse'}
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+def tokenize(query: str):
+    """
+    Split a query into tokens: '(', ')', ('literal', text) and words.
+    """
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Carácter inesperado en la posición {position}: {query[position:position + 10]!r}")
+        open_, close, literal, word = match.groups()
+        if literal is not None:
+            tokens.append(('literal', re.sub(r'\\(.)', r'\1', literal)))
+        else:
+            tokens.append(open_ or close or word)
+        position = match.end()
+    return tokens
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("La consulta termina de forma inesperada")
+        self.position += 1
+        return token
+
+    def expect(self, expected):
+        token = self.next()
+        if token != expected:
+            raise ValueError(f"Se esperaba {expected!r} y se encontró {token!r}")
+
+    def parse(self):
+        plan = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"Token inesperado: {self.peek()!r}")
+        return plan
+
+    def expr(self):
+        operands = [self.and_expr()]
+        while self.peek() == 'or':
+            self.next()
+            operands.append(self.and_expr())
+        return operands[0] if len(operands) == 1 else ('or', tuple(operands))
+
+    def and_expr(self):
+        operands = [self.atom()]
+        while self.peek() in ('and', 'that'):
+            self.next()
+            operands.append(self.atom())
+        return operands[0] if len(operands) == 1 else ('and', tuple(operands))
+
+    def atom(self):
+        token = self.next()
+        if token == '(':
+            plan = self.expr()
+            self.expect(')')
+            return plan
+
+        inverse = False
+        if token == 'inverse':
+            inverse = True
+            token = self.next()
+        if not isinstance(token, str) or token in KEYWORDS or token == ')':
+            raise ValueError(f"Token inesperado: {token!r}")
+
+        operator = self.peek()
+        if operator in ('some', 'only'):
+            self.next()
+            return (operator, token, inverse, self.atom())
+        if operator == 'value':
+            self.next()
+            value = self.next()
+            if value in ('(', ')') or value in KEYWORDS:
+                raise ValueError(f"Valor inesperado: {value!r}")
+            return ('value', token, inverse, value)
+        if inverse:
+            raise ValueError(f"'inverse {token}' debe ir seguido de some, only o value")
+        return ('class', token)
+
+def compile_query(query: str):
+    """
+    Parse a Manchester-syntax class expression into an evaluation plan.
+
+    Raises:
+        ValueError: if the query is not in the supported subset.
+    """
+    return _Parser(tokenize(query)).parse()
+
+class DLIndex:
+    """
+    Set-based evaluator of compiled plans over one ontology.
+
+    Property indexes (subject -> objects and object -> subjects) are built
+    once for every object property; class extensions and data-property
+    value indexes are built on first use.
+    """
+
+    def __init__(self, ontologie):
+        self.ontologie = ontologie
+        self.forward = {}
+        self.backward = {}
+        for prop in ontologie.object_properties():
+            forward, backward = {}, {}
+            for subject, object_ in prop.get_relations():
+                forward.setdefault(subject, set()).add(object_)
+                backward.setdefault(object_, set()).add(subject)
+            self.forward[prop.name] = forward
+            self.backward[prop.name] = backward
+        self._extensions = {}
+        self._values = {}
+        self._lock = Lock()
+
+    def evaluate(self, plan):
+        """
+        Individuals (set) matching a plan from compile_query().
+        """
+        kind = plan[0]
+        if kind == 'class':
+            return self.extension(plan[1])
+        if kind == 'and':
+            # Empezar por el operando mas chico para que las intersecciones sean baratas
+            operands = sorted((self.evaluate(operand) for operand in plan[1]), key=len)
+            return set(operands[0]).intersection(*operands[1:]) if operands[0] else set()
+        if kind == 'or':
+            return set().union(*(self.evaluate(operand) for operand in plan[1]))
+
+        _, name, inverse, argument = plan
+        if kind == 'value':
+            return self.value(name, inverse, argument)
+
+        forward, backward = self.relations(name, inverse)
+        fillers = self.evaluate(argument)
+        if kind == 'some':
+            if len(fillers) < len(forward):
+                return set().union(*(backward.get(filler, ()) for filler in fillers))
+            return {subject for subject, objects in forward.items() if not objects.isdisjoint(fillers)}
+        # only: todos los valores declarados de la propiedad estan en la clase
+        return {subject for subject, objects in forward.items() if objects <= fillers}
+
+    def extension(self, name):
+        """
+        Instances of a class, including its subclasses.
+        """
+        extension = self._extensions.get(name)
+        if extension is None:
+            class_ = self.entity(name)
+            if not isinstance(class_, ThingClass):
+                raise ValueError(f"{name} no es una clase de la ontología")
+            extension = frozenset(class_.instances())
+            with self._lock:
+                self._extensions[name] = extension
+        return extension
+
+    def relations(self, name, inverse=False):
+        """
+        (subject -> objects, object -> subjects) maps of an object property.
+        """
+        if name in INVERSE_ALIASES:
+            name, inverse = INVERSE_ALIASES[name], not inverse
+        if name not in self.forward:
+            raise ValueError(f"{name} no es una propiedad de objeto de la ontología")
+        if inverse:
+            return self.backward[name], self.forward[name]
+        return self.forward[name], self.backward[name]
+
+    def value(self, name, inverse, value):
+        """
+        Subjects of `name value x`: an individual for object properties,
+        a literal (compared case-insensitively) for data properties.
+        """
+        prop = self.entity(INVERSE_ALIASES.get(name, name))
+        if isinstance(prop, ObjectPropertyClass):
+            individual = self.entity(value[1] if isinstance(value, tuple) else value)
+            if individual is None:
+                return set()
+            _, backward = self.relations(name, inverse)
+            return set(backward.get(individual, ()))
+        if not isinstance(prop, DataPropertyClass) or inverse:
+            raise ValueError(f"{name} no es una propiedad de la ontología")
+
+        values = self._values.get(name)
+        if values is None:
+            values = {}
+            for subject, literal in prop.get_relations():
+                values.setdefault(str(literal).casefold(), set()).add(subject)
+            with self._lock:
+                self._values[name] = values
+        literal = value[1] if isinstance(value, tuple) else value
+        return set(values.get(literal.casefold(), ()))
+
+    def entity(self, name):
+        return self.ontologie[name]
+
+# Indice de la ontologia actual y resultados memorizados por consulta normalizada
+_index = None
+_index_lock = Lock()
+_results = LRUCache(1024)
+metrics.register_cache('dlquery', _results.stats)
+
+def get_index(ontologie):
+    """DLIndex of an ontology, rebuilt when the ontology object changes (reload)"""
+    global _index
+    with _index_lock:
+        if _index is None or _index.ontologie is not ontologie:
+            _index = DLIndex(ontologie)
+            _results.clear()
+        return _index
+
+def query(text: str, ontologie):
+    """
+    Answer a DL query.
+
+    Parameters:
+        text (str): Class expression in the supported Manchester subset.
+        ontologie: The loaded ontology.
+
+    Returns:
+        list: One dict per matching individual, ordered by IRI, with its
+            'iri', 'sample_name', 'name_individual' and 'name_class'.
+
+    Raises:
+        ValueError: if the query cannot be parsed or names unknown entities.
+    """
+    index = get_index(ontologie)
+    key = ' '.join(str(token) for token in tokenize(text))
+    results = _results.get(key)
+    if results is None:
+        individuals = index.evaluate(compile_query(text))
+        results = [_describe(individual) for individual in sorted(individuals, key=lambda individual: individual.iri)]
+        _results.set(key, results)
+    return results
+
+def _describe(individual):
+    nombre_prop = getNombreProp(individual, individual.get_properties())
+    nombre = nombre_prop[0] if nombre_prop and nombre_prop != "No se encontro" else individual.name
+    return {
+        'iri': individual.iri,
+        'sample_name': individual.name,
+        'name_individual': str(nombre),
+        'name_class': individual.is_a[0].name if individual.is_a else None
+    }
+
+def invalidate():
+    """
+    Drop the indexes and memoized results, e.g. after the ontology is modified.
+    """
+    global _index
+    with _index_lock:
+        _index = None
+        _results.clear()
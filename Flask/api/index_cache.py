@@ -0,0 +1,102 @@
+import os
+import glob
+import pickle
+import hashlib
+from pathlib import Path
+
+"""
+CACHÉ DE INDICES PRE-CONSTRUIDOS
+
+Guarda en disco los indices construidos al iniciar (indice de busqueda local,
+indice DBPedia, lista de clases), versionados por el hash del archivo del que
+se construyen. Los siguientes arranques los recargan sin volver a procesar
+la ontologia ni cargar spaCy.
+"""
+
+CACHE_DIR = os.environ.get('INDEX_CACHE_DIR', str(Path(__file__).parent.resolve()/".index_cache"))
+# Incrementar cuando cambia la estructura de algun indice cacheado
+CACHE_VERSION = 3
+
+def file_hash(path):
+    """
+    SHA-256 of a file's content, or '' if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return ''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_file(name, source_path):
+    """
+    Path of the cache file of a component built from the current content of `source_path`.
+    """
+    return os.path.join(CACHE_DIR, f"{name}-v{CACHE_VERSION}-{file_hash(source_path)[:16]}.pkl")
+
+def load(name, source_path):
+    """
+    Cached value of a component built from `source_path`, or None.
+    """
+    file = cache_file(name, source_path)
+    if os.path.exists(file):
+        try:
+            with open(file, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Caché {file} inválido, reconstruyendo: {e}")
+    return None
+
+def store(name, source_path, value):
+    """
+    Cache a component built from `source_path`, replacing older versions.
+    """
+    file = cache_file(name, source_path)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Descartar versiones anteriores del mismo componente
+        invalidate(name)
+        tmp = f"{file}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, file)
+    except OSError as e:
+        print(f"No se pudo guardar el caché {file}: {e}")
+
+def load_or_build(name, source_path, build):
+    """
+    Load a cached index built from `source_path`, or build and cache it.
+
+    Parameters
+    ----------
+    name: str
+        component name, used as the cache file prefix
+    source_path: str
+        file the index is built from; its hash keys the cache
+    build: callable
+        builds the index when there is no valid cache entry
+
+    Returns
+    -------
+    object
+        the cached or freshly built index
+    """
+    value = load(name, source_path)
+    if value is None:
+        value = build()
+        store(name, source_path, value)
+    return value
+
+def exists(name):
+    """
+    True if some version of a component is cached, even one built from older content.
+    """
+    return bool(glob.glob(os.path.join(CACHE_DIR, f"{name}-v*.pkl")))
+
+def invalidate(name):
+    """
+    Remove every cached file of a component, e.g. after the data it was built from changed.
+    """
+    for old in glob.glob(os.path.join(CACHE_DIR, f"{name}-v*.pkl")):
+        os.remove(old)
@@ -0,0 +1,114 @@
+import os
+from itertools import islice
+from threading import Lock
+
+from owlready2.sparql.main import PreparedSelectQuery
+
+from lru import LRUCache
+import metrics
+from sparql_client import normalize
+
+"""
+ENDPOINT SPARQL LOCAL
+
+Ejecuta consultas SELECT sobre la ontologia cargada con el motor SPARQL de
+owlready2, que las traduce a SQL sobre los indices del quadstore (los
+patrones con IRIs o literales fijos son busquedas indexadas, no recorridos).
+Las consultas preparadas se guardan por texto normalizado y la respuesta usa
+el formato JSON de resultados SPARQL, asi sirve tambien como reemplazo local
+del endpoint de DBPedia (DBPEDIA_ENDPOINT=http://localhost:5000/sparql).
+"""
+
+# Filas maximas por respuesta, aunque la consulta pida mas
+MAX_ROWS = int(os.environ.get('LOCAL_SPARQL_MAX_ROWS', 1000))
+PREPARED_CACHE_SIZE = int(os.environ.get('LOCAL_SPARQL_CACHE_SIZE', 256))
+
+_prepared = LRUCache(PREPARED_CACHE_SIZE)
+metrics.register_cache('local_sparql_prepared', _prepared.stats)
+_world = None
+_world_lock = Lock()
+
+def prepare(query: str, world):
+    """
+    Prepared SELECT query for a world, from the cache when possible.
+
+    Raises:
+        ValueError: if the query cannot be parsed or is not a SELECT.
+    """
+    global _world
+    with _world_lock:
+        # Otra ontologia cargada (recarga en caliente): las consultas preparadas ya no sirven
+        if _world is not world:
+            _world = world
+            _prepared.clear()
+
+    key = normalize(query)
+    prepared = _prepared.get(key)
+    if prepared is None:
+        try:
+            prepared = world.prepare_sparql(query)
+        except Exception as e:
+            raise ValueError(f"Consulta SPARQL inválida: {e}")
+        if not isinstance(prepared, PreparedSelectQuery):
+            raise ValueError("Solo se permiten consultas SELECT")
+        _prepared.set(key, prepared)
+    return prepared
+
+def select(query: str, world, limit=None):
+    """
+    Run a SELECT query.
+
+    Parameters:
+        query (str): SPARQL query text.
+        world: owlready2 World of the loaded ontology.
+        limit (int): Maximum rows (capped at MAX_ROWS).
+
+    Returns:
+        dict: SPARQL 1.1 JSON results ({'head': {'vars'}, 'results': {'bindings'}}).
+    """
+    prepared = prepare(query, world)
+    limit = MAX_ROWS if limit is None else min(limit, MAX_ROWS)
+    names = [name[1:] for name in prepared.column_names]
+    types = prepared.column_types
+
+    bindings = []
+    for row in islice(prepared.execute_raw(), limit):
+        binding = {}
+        i = column = 0
+        while i < len(row):
+            if types[i] == 'objs':
+                term = _resource(world, row[i])
+                i += 1
+            elif types[i] == 'onto':
+                term = {'type': 'uri', 'value': world.graph.c_2_onto[row[i]].base_iri}
+                i += 1
+            else:
+                value, datatype = row[i], row[i + 1]
+                if datatype == 'o':
+                    term = _resource(world, value)
+                elif value is None:
+                    term = None
+                else:
+                    term = {'type': 'literal', 'value': str(world._to_python(value, datatype))}
+                    if isinstance(datatype, str):
+                        term['xml:lang'] = datatype[1:]
+                    elif datatype:
+                        term['datatype'] = world._unabbreviate(datatype)
+                i += 2
+            if term is not None:
+                binding[names[column]] = term
+            column += 1
+        bindings.append(binding)
+
+    return {'head': {'vars': names}, 'results': {'bindings': bindings}}
+
+def _resource(world, storid):
+    if storid is None:
+        return None
+    if storid > 0:
+        return {'type': 'uri', 'value': world._unabbreviate(storid)}
+    return {'type': 'bnode', 'value': f"r{-storid}"}
+
+def cache_stats():
+    """Hits, misses and size of the prepared-query cache"""
+    return _prepared.stats()
@@ -0,0 +1,79 @@
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping with least-recently-used eviction.
+
+    Parameters
+    ----------
+    maxsize: int
+        maximum number of entries kept in memory
+    ttl: float | None
+        seconds an entry stays valid (None = no expiration)
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for `key` (marking it as recently used) or `default`.
+        """
+        with self._lock:
+            item = self._data.get(key, self._missing)
+            if item is not self._missing and item[0] is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = self._missing
+            if item is self._missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        """
+        Store a value, evicting the least recently used entry when full.
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, self._missing)
+            return default if item is self._missing else item[1]
+
+    def keys(self):
+        """Snapshot of the current keys, least recently used first"""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters and current size.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
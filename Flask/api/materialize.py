@@ -0,0 +1,106 @@
+import os
+from bisect import bisect_right
+from threading import Lock
+
+from restructure import struct_individuals, paginate, encode_cursor, decode_cursor
+from lru import LRUCache
+import metrics
+
+"""
+RESPUESTAS MATERIALIZADAS DE /searchClass
+
+Cada (clase, idioma) se estructura una sola vez y se guarda hasta que la
+ontologia cambie (invalidate). Los subárboles de propiedades se memorizan por
+individuo e idioma, asi los individuos compartidos entre clases se
+construyen una sola vez.
+
+Las consultas con proyeccion (fields/depth) no usan la respuesta completa:
+solo se construye la pagina pedida con los campos pedidos.
+
+El parametro lang es libre, asi que ambos cachés tienen tamaño maximo (LRU).
+"""
+
+# Idiomas con subárboles memorizados
+MAX_LANGS = int(os.environ.get('MATERIALIZE_MAX_LANGS', 8))
+# Respuestas completas (clase, idioma) guardadas
+MAX_RESPONSES = int(os.environ.get('MATERIALIZE_MAX_RESPONSES', 1024))
+
+_responses = LRUCache(MAX_RESPONSES)
+_subtrees = LRUCache(MAX_LANGS)
+_lock = Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def get_instances(class_, lang, fields=None, depth=None, limit=None, cursor=None):
+    """
+    Structured instances of a class in a language.
+
+    Parameters:
+        class_ (owlready2.entity.ThingClass): The ontology class.
+        lang (str): Language to translate the results.
+        fields (set): Instance fields to include (None = all).
+        depth (int): Levels of nested properties (None = unlimited).
+        limit (int): Page size (None = all).
+        cursor (str): Cursor of the page to return.
+
+    Returns:
+        tuple: (list of structured instances, cursor of the next page or None).
+    """
+    # Referencias tomadas al inicio: si la ontologia se recarga a mitad de la
+    # peticion, lo construido aqui no se mezcla con el snapshot nuevo
+    with _lock:
+        responses = _responses
+        memo = _subtrees.get(lang)
+        if memo is None:
+            memo = {}
+            _subtrees.set(lang, memo)
+
+    if fields is not None or depth is not None:
+        individuals, next_cursor = paginate(class_.instances(), limit, cursor)
+        with metrics.span('structure'):
+            return struct_individuals(individuals, class_, lang, memo, fields, depth), next_cursor
+
+    key = (class_.name, lang)
+    materialized = responses.get(key)
+    with _lock:
+        _stats['misses' if materialized is None else 'hits'] += 1
+    if materialized is None:
+        individuals = sorted(class_.instances(), key=lambda individual: individual.storid)
+        with metrics.span('structure'):
+            materialized = ([individual.storid for individual in individuals],
+                            struct_individuals(individuals, class_, lang, memo))
+        responses.set(key, materialized)
+
+    storids, instances = materialized
+    start = bisect_right(storids, decode_cursor(cursor)) if cursor else 0
+    end = len(instances) if limit is None else min(start + limit, len(instances))
+    next_cursor = encode_cursor(storids[end - 1]) if start < end < len(instances) else None
+    return instances[start:end], next_cursor
+
+def invalidate_classes(individual):
+    """
+    Drop the materialized responses of the classes an individual belongs to
+    (and their superclasses), e.g. after adding it. Subtrees of other
+    individuals stay valid because nothing points to a new individual yet.
+    """
+    names = {ancestor.name for class_ in individual.is_a if hasattr(class_, 'ancestors')
+             for ancestor in class_.ancestors()}
+    with _lock:
+        for key in _responses.keys():
+            if key[0] in names:
+                _responses.pop(key)
+
+def stats():
+    """Hits/misses of the materialized responses and how many are stored"""
+    with _lock:
+        return dict(_stats, size=len(_responses))
+
+metrics.register_cache('materialize', stats)
+
+def invalidate():
+    """
+    Drop every materialized response, e.g. after the ontology is modified or reloaded.
+    """
+    global _responses, _subtrees
+    with _lock:
+        _responses = LRUCache(MAX_RESPONSES)
+        _subtrees = LRUCache(MAX_LANGS)
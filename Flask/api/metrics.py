@@ -0,0 +1,200 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from threading import Lock
+
+"""
+METRICAS
+
+Tramos de tiempo por etapa (preprocess, translate, index_lookup, scoring,
+structure, sparql, ontology_save, queue, ...) acumulados en histogramas y
+contadores de hits/misses de los cachés, expuestos en formato de texto de
+Prometheus por /metrics.
+
+Los tramos de una peticion tambien se juntan en una lista por contexto
+(ContextVar), asi OntologyAPI puede devolverlos en el header Server-Timing.
+Para que los tramos de los threads del executor cuenten en la peticion que
+los lanzo, las tareas se envian con submit().
+"""
+
+# Devolver el header Server-Timing en cada respuesta
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+# Limites (segundos) de los buckets de los histogramas
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Prometheus-style histogram with a single label.
+
+    Parameters
+    ----------
+    name: str
+        metric name
+    help: str
+        description shown in the exposition
+    label: str
+        label name that distinguishes the series
+    """
+
+    def __init__(self, name, help, label, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, label_value, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Conteo por bucket (+Inf al final), suma y cantidad
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+class Counter:
+    """
+    Prometheus-style counter with a single label.
+    """
+
+    def __init__(self, name, help, label):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for value, total in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {total}')
+        return lines
+
+stages = Histogram('ontology_stage_seconds', 'Time spent in each processing stage.', 'stage')
+requests = Histogram('ontology_http_request_seconds', 'HTTP request duration by endpoint.', 'endpoint')
+responses = Counter('ontology_http_responses_total', 'HTTP responses by status code.', 'status')
+
+# Cachés registrados: nombre -> funcion que devuelve {'hits', 'misses', 'size', ...}
+_caches = {}
+# Tramos (etapa, segundos) de la peticion en curso
+_timings = ContextVar('timings', default=None)
+
+def register_cache(name, stats):
+    """
+    Expose the hit/miss counters of a cache, read at scrape time from `stats()`.
+    """
+    _caches[name] = stats
+
+def record(stage, seconds):
+    """
+    Add a measured duration to the stage histogram and to the current request.
+    """
+    stages.observe(stage, seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def span(stage):
+    """
+    Time the enclosed block as `stage`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+def timed(stage):
+    """
+    Decorator form of span().
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def submit(executor, function, *args, **kwargs):
+    """
+    executor.submit() that runs the task in the caller's context (so its
+    spans count for the current request) and records the time it waited
+    in the queue as the 'queue' stage.
+    """
+    submitted = time.perf_counter()
+    def run():
+        record('queue', time.perf_counter() - submitted)
+        return function(*args, **kwargs)
+    return executor.submit(copy_context().run, run)
+
+def start_request():
+    """
+    Start collecting the spans of a new request in the current context.
+    """
+    _timings.set([])
+
+def request_timings():
+    """
+    Spans collected since start_request(), as a list of (stage, seconds).
+    """
+    return list(_timings.get() or ())
+
+def server_timing(timings, total=None):
+    """
+    Server-Timing header value, adding up the spans of each stage.
+    """
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    if total is not None:
+        durations['total'] = total
+    return ', '.join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in durations.items())
+
+def expose():
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    lines = stages.expose() + requests.expose() + responses.expose()
+
+    caches = {}
+    for name, stats in _caches.items():
+        try:
+            caches[name] = stats()
+        except Exception as e:
+            print(f"No se pudieron leer las estadísticas del caché {name}: {e}")
+    for metric, key, kind, help in (('ontology_cache_hits_total', 'hits', 'counter', 'Cache hits.'),
+                                    ('ontology_cache_misses_total', 'misses', 'counter', 'Cache misses.'),
+                                    ('ontology_cache_size', 'size', 'gauge', 'Entries currently cached.')):
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        for name, values in sorted(caches.items()):
+            value = values.get(key)
+            if value is not None:
+                lines.append(f'{metric}{{cache="{name}"}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,94 @@
+import math
+import numpy as np
+
+from array import array
+
+from rapidfuzz import utils
+
+# Tamaño de los n-gramas de caracteres
+DEFAULT_N = 3
+
+class NGramIndex:
+    """
+    Inverted index from character n-grams to corpus positions.
+
+    Used in front of fuzzy matching: a query only gets scored against the
+    entries that share enough n-grams with it.
+
+    Parameters
+    ----------
+    corpus: list[str]
+        strings to index (already normalized by the caller)
+    n: int
+        n-gram size
+    """
+
+    def __init__(self, corpus, n=DEFAULT_N):
+        self.n = n
+        self.size = 0
+        self._postings = {}
+        for text in corpus:
+            self.add(text)
+
+    def grams(self, text: str):
+        """
+        Set of character n-grams of a normalized string.
+        """
+        text = utils.default_process(text or '')
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, text: str):
+        """
+        Index a new entry at the end of the corpus and return its position.
+        """
+        position = self.size
+        for gram in self.grams(text):
+            # int32 contiguos: menos memoria que listas de int y np.concatenate sin conversion
+            self._postings.setdefault(gram, array('i')).append(position)
+        self.size += 1
+        return position
+
+    def remove(self, position: int, text: str):
+        """
+        Drop a position from the postings of the n-grams of its text.
+        """
+        for gram in self.grams(text):
+            postings = self._postings.get(gram)
+            if postings and position in postings:
+                postings.remove(position)
+
+    def postings(self, gram: str):
+        """
+        Positions of the entries that contain an n-gram.
+        """
+        return self._postings.get(gram, ())
+
+    def candidates(self, query: str, min_overlap: float):
+        """
+        Positions whose n-grams overlap the query's.
+
+        Parameters
+        ----------
+        query: str
+            query string
+        min_overlap: float
+            fraction (0-1) of the query n-grams an entry must contain.
+            Lower values favour recall, higher values favour speed.
+
+        Returns
+        -------
+        numpy.ndarray | None
+            sorted candidate positions, or None when the index cannot filter
+            (empty overlap threshold or query shorter than n)
+        """
+        query_grams = self.grams(query)
+        if min_overlap <= 0 or not query_grams:
+            return None
+
+        postings = [postings for postings in map(self.postings, query_grams) if len(postings)]
+        if not postings:
+            return np.empty(0, dtype=np.intp)
+
+        counts = np.bincount(np.concatenate(postings), minlength=self.size)
+        threshold = max(1, math.ceil(min_overlap * len(query_grams)))
+        return np.flatnonzero(counts >= threshold)
@@ -1,51 +1,144 @@
 from owlready2 import *
 from pathlib import Path
-from mtranslate import translate
 from functools import lru_cache
 
 from restructure import *
-from preprocess import preprocess, match as fuzzymatch
+from preprocess import preprocess_batch
+from translator import translate_many
+from search_engine import SearchEngine
+from payload_table import PayloadTable
+from threading import Lock, Thread
+from rwlock import RWLock
+import materialize
+import dlquery
+import class_catalogue
+import reasoning
+import local_sparql
+import index_cache
+import corpus_store
+import metrics
+import os
+import time
 
 path = Path(__file__).parent.resolve()
 path = path.parent.parent
-path = path/"resourse/ontology.owx"
+# ONTOLOGY_PATH permite servir otra ontologia (p. ej. las sinteticas de benchmark.py)
+path = Path(os.environ.get('ONTOLOGY_PATH', path/"resourse/ontology.owx"))
 
-ontologie = get_ontology(str(path)).load()
+# 'file': la ontologia vive en memoria y cada /addition reescribe el .owx
+# 'sqlite': quadstore persistente de owlready2, el .owx se importa una sola vez
+BACKEND = os.environ.get('ONTOLOGY_BACKEND', 'file')
+QUADSTORE_PATH = os.environ.get('ONTOLOGY_QUADSTORE', str(Path(__file__).parent.resolve()/"ontology.sqlite3"))
+ONTOLOGY_IRI = "http://www.semanticweb.org/ontologies/oncology-ontology#"
+# Segundos entre revisiones del .owx para recargarlo en caliente (0 = desactivado)
+WATCH_INTERVAL = float(os.environ.get('ONTOLOGY_WATCH_INTERVAL', 0))
+# Servir tambien las inferencias del snapshot de reasoning.py (si existe para el .owx actual)
+USE_INFERRED = os.environ.get('ONTOLOGY_INFERRED', '1') == '1'
 
-# Cache para traducciones
-_translation_cache = {}
+# Lectores concurrentes (/searchClass, ...) o un solo escritor (/addition)
+ontology_lock = RWLock()
 
-def cached_translate(text, dest='es'):
-	"""Traducción con caché en memoria"""
-	key = (text, dest)
-	if key not in _translation_cache:
-		_translation_cache[key] = translate(text, dest)
-	return _translation_cache[key]
+# La ontologia se carga recien cuando algo la necesita (los indices pueden venir del caché)
+_ontologie = None
+_ontologie_lock = Lock()
+# Hash del .owx que corresponde a la ontologia en memoria (para ignorar nuestras propias escrituras)
+_loaded_hash = None
+# Version de los datos servidos: sube con cada adicion, cambio o recarga (invalida las respuestas cacheadas)
+_version = 0
 
-def getClassesOntologie():
+def version():
+	"""Contador que cambia cada vez que cambian los resultados que puede devolver la ontologia"""
+	return _version
+
+def _bump_version():
+	global _version
+	_version += 1
+
+def get_ontologie():
+	"""Carga la ontologia en el primer uso"""
+	global _ontologie, _loaded_hash
+	if _ontologie is None:
+		with _ontologie_lock:
+			if _ontologie is None:
+				_loaded_hash = index_cache.file_hash(str(path))
+				if BACKEND == 'sqlite':
+					default_world.set_backend(filename=QUADSTORE_PATH, exclusive=False)
+					if ONTOLOGY_IRI in default_world.ontologies:
+						_ontologie = default_world.ontologies[ONTOLOGY_IRI]
+					else:
+						# Primera ejecución: importar el .owx una sola vez al quadstore
+						_ontologie = get_ontology(str(path)).load()
+						default_world.save()
+				else:
+					_ontologie = get_ontology(str(path)).load()
+				apply_inferred(_ontologie)
+	return _ontologie
+
+def apply_inferred(ontologie):
+	"""Agrega a la ontologia cargada las inferencias del snapshot offline, si hay uno vigente"""
+	snapshot = reasoning.load(str(path)) if USE_INFERRED else None
+	if snapshot is not None:
+		added = reasoning.apply(ontologie, snapshot)
+		print(f"Inferencias de {snapshot['reasoner']} aplicadas: {added} tripletas")
+	elif USE_INFERRED and reasoning.stale(str(path)):
+		# Tipico tras una /addition con el backend 'file': el .owx cambio de hash
+		print(f"AVISO: el snapshot de inferencias es de una version anterior de {path.name} "
+			f"y no se aplica; volver a generarlo con: python reasoning.py")
+
+def export_ontology(file=str(path)):
+	"""
+	Write the current ontology (including additions) to a file.
+
+	With the sqlite backend this is the only time the .owx is rewritten.
+	"""
+	with ontology_lock.read():
+		get_ontologie().save(file=file)
+	return file
+
+def getClassesOntologie(ontologie=None):
 	"""
 	Retrieve all classes and their subclasses from the ontology.
 	"""
-	clasess = []
-	for classOntology in ontologie.classes():
-		if classOntology.name not in str(clasess) :
-			clasess.append(classOntology.name)
-	return clasess
+	# dict.fromkeys deduplica en O(1) por clase conservando el orden
+	return list(dict.fromkeys(classOntology.name for classOntology in (ontologie or get_ontologie()).classes()))
 
-name_classes = getClassesOntologie()
+name_classes = index_cache.load_or_build('classes', str(path), getClassesOntologie)
 
 # Pre-construir índice de búsqueda al iniciar
 _search_index = None
 
 def build_search_index():
-	"""Construye un índice en memoria para búsquedas rápidas"""
+	"""Carga desde el caché en disco, o construye, el motor de búsqueda sobre todos los individuos"""
 	global _search_index
-	if _search_index is not None:
-		return _search_index
+	if _search_index is None:
+		_search_index = _load_search_index(_build_search_index)
+		print(f"Índice construido con {len(_search_index)} individuos")
+	return _search_index
+
+def _load_search_index(build):
+	# Con SEARCH_STORE=1 (serve.py) el corpus se mapea desde disco, compartido entre procesos
+	load_or_build = corpus_store.load_or_build if corpus_store.ENABLED else index_cache.load_or_build
+	return load_or_build(search_index_name(), str(path), build)
+
+def search_index_name():
+	"""El índice construido con inferencias se cachea aparte del construido solo con lo declarado"""
+	return 'search_index_inferred' if USE_INFERRED and reasoning.available(str(path)) else 'search_index'
+
+def _build_search_index(ontologie=None):
+	keys, corpus, entries = _index_entries((ontologie or get_ontologie()).individuals())
+	# Payloads por columnas: clases internadas, IRIs como namespace + nombre local
+	payloads = PayloadTable(entries, fields=SEARCH_ENTRY_FIELDS, interned=('class_name',), iris=('iri',))
+	return SearchEngine(corpus, payloads, keys=keys)
 
-	_search_index = []
-	for individual in ontologie.individuals():
-		class_name = str(list(individual.is_a)[0])
+# Datos de cada individuo en el índice (payloads)
+SEARCH_ENTRY_FIELDS = ('iri', 'sample_name', 'class_name', 'nombre')
+
+def _index_entries(individuals):
+	"""Claves (IRIs), textos buscables y datos de cada individuo para el índice"""
+	values_by_entry = []
+	entries = []
+	for individual in individuals:
+		class_name = class_key(list(individual.is_a)[0])
 		nombre_prop = getNombreProp(individual, individual.get_properties())
 		nombre = nombre_prop[0] if nombre_prop and nombre_prop != "No se encontro" else individual.name
 
@@ -55,44 +148,146 @@ def build_search_index():
 			values = getattr(individual, propertie.name, None)
 			if values:
 				for value in values:
-					searchable_values.append(preprocess(str(value)))
+					searchable_values.append(str(value))
 
-		_search_index.append({
-			'individual': individual,
+		values_by_entry.append(searchable_values)
+		entries.append({
+			'iri': individual.iri,
+			'sample_name': individual.name,
 			'class_name': class_name,
-			'nombre': nombre,
-			'searchable': ' '.join(searchable_values)
+			'nombre': nombre
 		})
 
-	print(f"Índice construido con {len(_search_index)} individuos")
-	return _search_index
+	# Pre-procesar todos los valores en lote con nlp.pipe
+	processed = iter(preprocess_batch([value for values in values_by_entry for value in values]))
+	corpus = [' '.join(next(processed) for _ in values) for values in values_by_entry]
+
+	return [entry['iri'] for entry in entries], corpus, entries
+
+def class_key(class_):
+	"""
+	Key of a class in the search results ('ontology.owx.Cancer'), the same
+	with both backends (the quadstore names the namespace after the IRI).
+	"""
+	if isinstance(class_, ThingClass) and class_.iri.startswith(ONTOLOGY_IRI):
+		return f"{path.name}.{class_.name}"
+	return str(class_)
+
+def add_individual(individual):
+	"""
+	Make a new individual searchable without rebuilding the index.
+	Only its own property values are preprocessed.
+	"""
+	add_individuals([individual])
+
+def add_individuals(individuals):
+	"""
+	Index several new individuals with a single copy of the index entries.
+	"""
+	if not individuals:
+		return
+	keys, corpus, entries = _index_entries(individuals)
+	build_search_index().add_many(zip(keys, corpus, entries))
+	for individual in individuals:
+		materialize.invalidate_classes(individual)
+	dlquery.invalidate()
+	_bump_version()
+
+def update_individual(individual):
+	"""
+	Re-index an individual whose properties changed.
+	"""
+	index = build_search_index()
+	keys, corpus, entries = _index_entries([individual])
+	index.update(keys[0], corpus[0], entries[0])
+	# Como en las adiciones: el caché en disco y el corpus compartido quedan viejos
+	index_cache.invalidate(search_index_name())
+	corpus_store.mark_stale(search_index_name(), str(path))
+	# Otros individuos pueden incluirlo en sus subárboles materializados
+	materialize.invalidate()
+	dlquery.invalidate()
+	_bump_version()
+
+def remove_individual(iri: str):
+	"""
+	Drop an individual from the index.
+	"""
+	build_search_index().remove(iri)
+	index_cache.invalidate(search_index_name())
+	corpus_store.mark_stale(search_index_name(), str(path))
+	materialize.invalidate()
+	dlquery.invalidate()
+	_bump_version()
 
 # Construir índice al cargar el módulo
 build_search_index()
 
-def search(query: str):
+# Campos de cada resultado de /search (proyectables con fields=)
+SEARCH_FIELDS = ('name', 'iri', 'name_individual', 'sample_name', 'score')
+
+def search(query: str, limit=None, offset=0, fields=None):
+	"""
+	Ranked fuzzy search over the pre-built index.
+
+	Parameters:
+		query (str): Preprocessed query.
+		limit (int): Maximum number of individuals to return (None = all).
+		offset (int): Number of ranked individuals to skip.
+		fields (set): Keys of SEARCH_FIELDS to include (None = all).
+
+	Returns:
+		dict: Class name -> list of matches, ordered by descending score.
 	"""
-	Búsqueda optimizada usando índice pre-construido.
+	index = build_search_index()
+	fields = SEARCH_FIELDS if fields is None else fields
+	hits = index.search(query, limit=limit, offset=offset)
+	return _group_hits(hits, fields, _translated_names([hits], fields))
+
+def search_batch(queries, limit=None, offset=0, fields=None):
+	"""
+	Ranked fuzzy search of many queries at once (one query x corpus scoring
+	pass and one translation lookup for every name in the results).
+
+	Parameters:
+		queries (list): Preprocessed queries.
+		limit, offset, fields: As in search(), applied to every query.
+
+	Returns:
+		list: One search() result per query, aligned with `queries`.
 	"""
-	results = {}
 	index = build_search_index()
+	fields = SEARCH_FIELDS if fields is None else fields
+	hits = index.search_many(queries, limit=limit, offset=offset)
+	names = _translated_names(hits, fields)
+	return [_group_hits(query_hits, fields, names) for query_hits in hits]
+
+def _translated_names(hits, fields):
+	# Usar caché para traducciones, una sola consulta para todos los nombres
+	if 'name' not in fields:
+		return {}
+	names = list({entry['nombre'] for query_hits in hits for entry, _ in query_hits})
+	return dict(zip(names, translate_many(names, dest='es')))
+
+def _group_hits(hits, fields, names):
+	results = {}
+	for entry, score in hits:
+		class_name = entry['class_name']
+		if class_name not in results:
+			results[class_name] = []
 
-	for entry in index:
-		# Buscar en el texto pre-procesado
-		match_score = fuzzymatch(entry['searchable'], query)
-		if match_score >= 50.0:
-			class_name = entry['class_name']
-			if class_name not in results:
-				results[class_name] = []
-
-			# Usar caché para traducciones
-			nombre = entry['nombre']
-			results[class_name].append({
-				'name': cached_translate(nombre, dest='es'),
-				'iri': entry['individual'].iri,
-				'name_individual': nombre,
-				'sample_name': entry['individual'].name
-			})
+		nombre = entry['nombre']
+		result = {}
+		if 'name' in fields:
+			result['name'] = names[nombre]
+		if 'iri' in fields:
+			result['iri'] = entry['iri']
+		if 'name_individual' in fields:
+			result['name_individual'] = nombre
+		if 'sample_name' in fields:
+			result['sample_name'] = entry['sample_name']
+		if 'score' in fields:
+			result['score'] = score
+		results[class_name].append(result)
 
 	return results
 
@@ -106,25 +301,112 @@ def get(iri: str):
 	Returns:
 		An instance of the item in the ontology with the given IRI.
 	"""
-	return ontologie[iri[iri.find('#'):]] # aqui deberia estar el cuerpo completo de un item basado en su iri
+	with ontology_lock.read():
+		return get_ontologie()[iri[iri.find('#'):]] # aqui deberia estar el cuerpo completo de un item basado en su iri
 
-def getInstancesByClass(name: str, lang: str): 
+def getInstancesByClass(name: str, lang: str, fields=None, depth=None, limit=None, cursor=None):
 	"""
 	Retrieve instances of a specified class from the ontology.
 
 	Parameters:
 		name (str): The name of the class in the ontology to retrieve instances for.
 		lang (str): Language to translate the results
+		fields (set): Instance fields to include (None = all).
+		depth (int): Levels of nested properties to include (None = unlimited).
+		limit (int): Page size (None = all instances).
+		cursor (str): Cursor returned with the previous page.
 
 	Returns:
-		list: A list of dictionaries, each representing an instance of the specified class.
+		tuple: A list of dictionaries, each representing an instance of the specified class,
+			and the cursor of the next page (None on the last page).
 			Each dictionary contains the 'iri', 'name_class', 'name_individual', and 'properties'
 			of the individual. Returns an empty list if the class is not found.
 	"""
-	class_ = getattr(ontologie, name, None)
-	if class_ is None: 
-		return []
-	return struct_individuals(class_.instances(), class_, lang)
+	class_name = _resolve_class(name)
+	if class_name is None:
+		return [], None
+	with ontology_lock.read():
+		# Si la ontologia cambio mientras se resolvia el nombre, la clase puede ya no existir
+		class_ = get_class_catalogue().get(class_name)
+		if class_ is None:
+			return [], None
+		return materialize.get_instances(class_, lang, fields, depth, limit, cursor)
+
+def get_class_catalogue():
+	"""
+	Class catalogue (name lookup, hierarchy, closures, instance counts) of the current ontology version.
+	"""
+	return class_catalogue.get_catalogue(get_ontologie(), _version)
+
+def _resolve_class(name):
+	# El nombre se resuelve fuera del lock: si no hay coincidencia local se
+	# traduce (red) y eso no debe bloquear las adiciones. El catalogo no cambia
+	# una vez armado, asi que basta con tomarlo con el lock.
+	with ontology_lock.read():
+		catalogue = get_class_catalogue()
+	return class_catalogue.resolve(catalogue, name)
+
+def classes(name=None, lang=None):
+	"""
+	Class catalogue for /classes.
+
+	Parameters:
+		name (str): A class to describe (any casing, or translated), or None for all of them.
+		lang (str): Language of the 'label' of each class (None = no labels).
+
+	Returns:
+		dict: {'count', 'roots', 'tree', 'classes'} or, with `name`, the entry
+			of that class (None if it does not exist).
+	"""
+	with ontology_lock.read():
+		catalogue = get_class_catalogue()
+	# El catalogo no cambia una vez armado: el resto (incluida la traduccion del nombre) va sin lock
+	if name is not None:
+		class_name = class_catalogue.resolve(catalogue, name)
+		if class_name is None:
+			return None
+		entries = [catalogue.describe(class_name)]
+	else:
+		entries = [catalogue.describe(class_name) for class_name in sorted(catalogue.classes)]
+	result = None if name is not None else {'count': len(catalogue), 'roots': catalogue.roots, 'tree': catalogue.tree()}
+
+	if lang:
+		labels = translate_many([entry['name'].replace('_', ' ') for entry in entries], dest=lang)
+		for entry, label in zip(entries, labels):
+			entry['label'] = label
+	if result is None:
+		return entries[0]
+	result['classes'] = entries
+	return result
+
+def dl_query(text: str, limit=None):
+	"""
+	Answer a Manchester-syntax DL query (see dlquery.py) over the asserted facts.
+
+	Parameters:
+		text (str): Class expression, e.g. 'Tratamiento that combate some Cancer'.
+		limit (int): Maximum number of individuals to return (None = all).
+
+	Returns:
+		list: Matching individuals ordered by IRI.
+	"""
+	with ontology_lock.read(), metrics.span('dlquery'):
+		results = dlquery.query(text, get_ontologie())
+	return results if limit is None else results[:limit]
+
+def sparql(query: str, limit=None):
+	"""
+	Run a SPARQL SELECT query over the loaded ontology (see local_sparql.py).
+
+	Parameters:
+		query (str): SPARQL query text.
+		limit (int): Maximum number of rows (capped at local_sparql.MAX_ROWS).
+
+	Returns:
+		dict: SPARQL JSON results.
+	"""
+	with ontology_lock.read(), metrics.span('local_sparql'):
+		return local_sparql.select(query, get_ontologie().world, limit)
 
 def store_in_ontology(items_list, query):
 	class_mapping = {
@@ -150,39 +432,151 @@ def store_in_ontology(items_list, query):
 		}
 	}
 
+	global _loaded_hash
+	added = []
 	try:
-		with ontologie: 
-			for item in items_list:
-				item_type = str(item.get('type', {}).get('value', '')).lower()
+		with ontology_lock.write():
+			# La ontologia se toma con el lock: una recarga pudo reemplazarla mientras se esperaba
+			ontologie = get_ontologie()
+			with ontologie:
+				for item in items_list:
+					item_type = str(item.get('type', {}).get('value', '')).lower()
 				
-				if item_type in class_mapping:
-					mapping = class_mapping[item_type]
+					if item_type in class_mapping:
+						mapping = class_mapping[item_type]
 					
-					onto_class = ontologie.search_one(iri=f"*#{mapping['class']}")
-					if not onto_class:
-						print(f"Clase no encontrada: {mapping['class']}")
-						continue
+						onto_class = ontologie.search_one(iri=f"*#{mapping['class']}")
+						if not onto_class:
+							print(f"Clase no encontrada: {mapping['class']}")
+							continue
 					
-					try:
-						new_individual = onto_class()
+						try:
+							new_individual = onto_class()
+							added.append(new_individual)
 						
-						if 'name' in item and mapping['name_prop']:
-							setattr(new_individual, mapping['name_prop'], 
-									item['name']['value'])
+							if 'name' in item and mapping['name_prop']:
+								set_value(new_individual, mapping['name_prop'], 
+										item['name']['value'], ontologie)
 						
-						if 'comment' in item and mapping['desc_prop']:
-							setattr(new_individual, mapping['desc_prop'], 
-									item['comment']['value'])
+							if 'comment' in item and mapping['desc_prop']:
+								set_value(new_individual, mapping['desc_prop'], 
+										item['comment']['value'], ontologie)
 							
-						print(f"Creado individuo de tipo {item_type}: {item.get('name', {}).get('value', 'Sin nombre')}")
+							print(f"Creado individuo de tipo {item_type}: {item.get('name', {}).get('value', 'Sin nombre')}")
 					
-					except Exception as e:
-						print(f"Error al crear individuo de tipo {item_type}: {str(e)}")
-				else:
-					print(f"Tipo no reconocido: {item_type}")
+						except Exception as e:
+							print(f"Error al crear individuo de tipo {item_type}: {str(e)}")
+					else:
+						print(f"Tipo no reconocido: {item_type}")
 					
-		ontologie.save(file=str(path))
+			# Dentro del lock: un lector o una recarga no ven la ontologia guardada sin indexar
+			with metrics.span('ontology_save'):
+				if BACKEND == 'sqlite':
+					# Commit incremental en el quadstore, sin reescribir el .owx
+					default_world.save()
+				else:
+					ontologie.save(file=str(path))
+					_loaded_hash = index_cache.file_hash(str(path))
+			# Solo se indexan los individuos creados, sin reconstruir el índice
+			add_individuals(added)
+			index_cache.invalidate(search_index_name())
+			# El constructor de serve.py reconstruye el corpus compartido; este worker ya tiene las adiciones
+			corpus_store.mark_stale(search_index_name(), str(path))
 	except Exception as e:
 		return {"error": 500, "message": f"Error al guardar en la ontología: {str(e)}"}
 
-	return search(query);
\ No newline at end of file
+	return search(query);
+
+def set_value(individual, prop_name, value, ontologie=None):
+	"""Asigna un valor a una propiedad funcional o no funcional (de `ontologie`, por defecto la cargada)"""
+	prop = (ontologie or get_ontologie())[prop_name]
+	if prop is not None and FunctionalProperty not in prop.is_a:
+		value = [value]
+	setattr(individual, prop_name, value)
+
+def status():
+	"""Componentes de la ontologia ya cargados en memoria"""
+	return {
+		'ontology': _ontologie is not None,
+		'search_index': _search_index is not None,
+		'classes': name_classes is not None,
+		'reloading': _reload_lock.locked()
+	}
+
+"""
+RECARGA EN CALIENTE
+
+Cuando el .owx cambia (editado en Protégé) se carga en un World nuevo y se
+construyen sus indices en segundo plano; luego ontologia, indice de busqueda,
+clases y respuestas materializadas se reemplazan juntos. Las peticiones en
+curso terminan con las referencias que ya tomaron del snapshot anterior.
+"""
+_reload_lock = Lock()
+
+def reload_ontology():
+	"""
+	Load the .owx into a fresh world, build its indexes and swap them in.
+
+	Returns:
+		bool: False if another reload is already running.
+	"""
+	global _ontologie, _search_index, name_classes, _loaded_hash
+	if BACKEND == 'sqlite':
+		# El quadstore es la fuente de verdad; el .owx solo se importa la primera vez
+		raise RuntimeError("La recarga en caliente requiere ONTOLOGY_BACKEND=file")
+	if not _reload_lock.acquire(blocking=False):
+		return False
+	try:
+		start = time.perf_counter()
+		source_hash = index_cache.file_hash(str(path))
+		ontologie = World().get_ontology(str(path)).load()
+		apply_inferred(ontologie)
+		classes = index_cache.load_or_build('classes', str(path), lambda: getClassesOntologie(ontologie))
+		index = _load_search_index(lambda: _build_search_index(ontologie))
+
+		# Sin escritores en curso: una /addition no puede quedar a mitad entre dos snapshots
+		with ontology_lock.write():
+			_ontologie, _search_index, name_classes, _loaded_hash = ontologie, index, classes, source_hash
+			materialize.invalidate()
+			_bump_version()
+		print(f"Ontología recargada con {len(index)} individuos ({time.perf_counter() - start:.1f}s)")
+		return True
+	finally:
+		_reload_lock.release()
+
+def reload_in_background():
+	"""Start reload_ontology() in a daemon thread"""
+	thread = Thread(target=_reload_logged, name='ontology-reload', daemon=True)
+	thread.start()
+	return thread
+
+def _reload_logged():
+	try:
+		reload_ontology()
+	except Exception as e:
+		print(f"Error al recargar la ontología: {e}")
+
+def start_watch(interval=WATCH_INTERVAL):
+	"""
+	Check the .owx every `interval` seconds in a daemon thread and reload it
+	when its content differs from the ontology in memory.
+	"""
+	def watch():
+		mtime = os.path.getmtime(path)
+		while True:
+			time.sleep(interval)
+			current = os.path.getmtime(path)
+			if current == mtime:
+				continue
+			mtime = current
+			# Las /addition tambien reescriben el archivo: solo recargar si el contenido es otro
+			if _ontologie is not None and index_cache.file_hash(str(path)) == _loaded_hash:
+				continue
+			_reload_logged()
+
+	thread = Thread(target=watch, name='ontology-watch', daemon=True)
+	thread.start()
+	return thread
+
+if WATCH_INTERVAL and BACKEND == 'file':
+	start_watch()
\ No newline at end of file
@@ -0,0 +1,126 @@
+from array import array
+from collections.abc import Sequence
+from itertools import accumulate, islice
+
+"""
+TABLA COMPACTA DE PAYLOADS
+
+Los resultados del indice de busqueda eran una lista de dicts, uno por
+individuo o enfermedad (~400 bytes cada uno entre el dict y sus strings).
+PayloadTable guarda los mismos datos por columnas:
+
+    campos internados   un codigo int32 por entrada + la tabla de valores
+                        distintos (nombres de clase)
+    IRIs                prefijo internado (namespace) + nombre local
+    resto               un solo string (arena) con offsets int64
+
+El dict de una entrada se arma recien cuando se pide (solo para los hits).
+"""
+
+# Codigo de una entrada eliminada
+_REMOVED = -1
+
+class PayloadTable(Sequence):
+    """
+    Column-oriented, append-only storage of dict payloads sharing the same keys.
+
+    Parameters
+    ----------
+    payloads: iterable[dict | None]
+        payloads to store (None marks a removed entry)
+    fields: tuple[str]
+        keys of every payload, in order
+    interned: tuple[str]
+        fields with few distinct values, stored as integer codes
+    iris: tuple[str]
+        IRI fields, stored as an interned namespace plus a local name
+    """
+
+    def __init__(self, payloads=(), fields=(), interned=(), iris=()):
+        self.fields = tuple(fields)
+        self.interned = tuple(field for field in self.fields if field in interned)
+        self.iris = tuple(field for field in self.fields if field in iris)
+        # Columnas guardadas en la arena: campos de texto y nombres locales de las IRIs
+        self._texts = tuple(field for field in self.fields if field not in self.interned)
+        self._values = []
+        self._codes = {}
+        self._columns = {field: array('i') for field in self.interned + self.iris}
+        self._present = array('b')
+        self._arena = ''
+        self._offsets = array('q', [0])
+        self._append_all(payloads)
+
+    def __len__(self):
+        return len(self._present)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not self._present[i]:
+            return None
+
+        payload = {}
+        cell = i * len(self._texts)
+        for field in self.fields:
+            if field in self._columns:
+                value = self._values[self._columns[field][i]]
+                if field in self.interned:
+                    payload[field] = value
+                    continue
+            text = self._arena[self._offsets[cell]:self._offsets[cell + 1]]
+            cell += 1
+            payload[field] = value + text if field in self.iris else text
+        return payload
+
+
+    def copy(self):
+        table = PayloadTable.__new__(PayloadTable)
+        table.__dict__.update(self.__dict__)
+        table._values = list(self._values)
+        table._codes = dict(self._codes)
+        table._columns = {field: array('i', column) for field, column in self._columns.items()}
+        table._present = array('b', self._present)
+        table._offsets = array('q', self._offsets)
+        return table
+
+    def edited(self, removed=(), appended=(), empty=None):
+        """
+        Copy of the table with the `removed` positions dropped and `appended` added at the end.
+        """
+        if empty is not None:
+            raise ValueError("Las entradas eliminadas solo pueden quedar en None")
+        table = self.copy()
+        for position in removed:
+            table._present[position] = 0
+        table._append_all(appended)
+        return table
+
+    def _intern(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def _append_all(self, payloads):
+        cells = []
+        for payload in payloads:
+            self._present.append(payload is not None)
+            payload = payload or {}
+            for field in self.interned:
+                self._columns[field].append(self._intern(payload.get(field)) if payload else _REMOVED)
+            for field in self._texts:
+                value = payload.get(field) or ''
+                if field in self.iris:
+                    # Namespace hasta el ultimo '#' o '/', internado; el nombre local va a la arena
+                    cut = max(value.rfind('#'), value.rfind('/')) + 1
+                    self._columns[field].append(self._intern(value[:cut]))
+                    value = value[cut:]
+                cells.append(value)
+        if cells:
+            ends = accumulate((len(cell) for cell in cells), initial=self._offsets[-1])
+            self._offsets.extend(islice(ends, 1, None))
+            self._arena += ''.join(cells)
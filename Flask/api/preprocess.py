@@ -1,14 +1,46 @@
-import spacy
 import re
+import unicodedata
 
+from threading import Lock
 from rapidfuzz import fuzz, utils
 
-nlp = spacy.load("es_core_news_sm")
+from lru import LRUCache
+import metrics
 
+# spaCy se carga recien cuando un string no cacheado necesita procesarse
+_nlp = None
+_nlp_lock = Lock()
+
+# Memo de strings ya procesados (queries y valores de propiedades repetidos)
+PREPROCESS_CACHE_SIZE = 8192
+BATCH_SIZE = 256
+
+_preprocess_cache = LRUCache(PREPROCESS_CACHE_SIZE)
+metrics.register_cache('preprocess', _preprocess_cache.stats)
+
+def get_nlp():
+    """
+    Spanish spaCy pipeline, loaded on first use.
+
+    The lemmatizer only needs tok2vec/morphologizer, so the parser and NER
+    components are disabled.
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load("es_core_news_sm", disable=["parser", "ner"])
+    return _nlp
+
+def is_loaded():
+    return _nlp is not None
+
+@metrics.timed('preprocess')
 def preprocess(s: str):
     """
     Preprocess strings with nlp techniques
-    
+
     Parameters
     ----------
     s: str
@@ -17,13 +49,63 @@ def preprocess(s: str):
     Returns
     -------
     str
-        string processed 
+        string processed
+    """
+    processed = _preprocess_cache.get(s)
+    if processed is None:
+        processed = lemmatize(get_nlp()(clean(s)))
+        _preprocess_cache.set(s, processed)
+    return processed
+
+@metrics.timed('preprocess')
+def preprocess_batch(texts, batch_size=BATCH_SIZE):
+    """
+    Preprocess many strings at once through `nlp.pipe`.
+
+    Parameters
+    ----------
+    texts: list[str]
+        strings to process
+    batch_size: int
+        number of documents spaCy processes per batch
+
+    Returns
+    -------
+    list[str]
+        processed strings, aligned with `texts`
+    """
+    processed = {}
+    pending = []
+    for s in texts:
+        if s in processed:
+            continue
+        cached = _preprocess_cache.get(s)
+        processed[s] = cached
+        if cached is None:
+            pending.append(s)
+
+    if not pending:
+        return [processed[s] for s in texts]
+
+    docs = get_nlp().pipe((clean(s) for s in pending), batch_size=batch_size)
+    for s, doc in zip(pending, docs):
+        processed[s] = lemmatize(doc)
+        _preprocess_cache.set(s, processed[s])
+
+    return [processed[s] for s in texts]
+
+def clean(s: str):
+    """
+    Normalize a raw string before running it through spaCy.
     """
     s = s.replace('_', ' ')
-    s = remove_punctuation(s)
-    doc = nlp(s)    
+    return remove_punctuation(s)
+
+def lemmatize(doc):
+    """
+    Join the lowercased lemmas of a spaCy doc, skipping stop words and punctuation.
+    """
     processed_words = [token.lemma_.lower() for token in doc if not token.is_stop and not token.is_punct]
-    
     return ' '.join(processed_words)
 
 def remove_punctuation(s: str):
@@ -38,10 +120,17 @@ def remove_punctuation(s: str):
     Returns
     -------
     str
-        cleaned string 
-    """ 
+        cleaned string
+    """
     return re.sub(r'[^\w\s]', '', s)
 
+def normalize(text):
+    """
+    Lowercase, accent-free form used for keys and prefixes ('_' counts as a space).
+    """
+    text = unicodedata.normalize('NFKD', str(text).replace('_', ' ').casefold())
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
 def match(s: str, t: str):
     """
     Calculates the fuzzy match between two strings.
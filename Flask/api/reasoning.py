@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+from owlready2 import World, sync_reasoner_hermit, sync_reasoner_pellet
+
+import index_cache
+
+"""
+MATERIALIZACION DE INFERENCIAS (TRABAJO OFFLINE)
+
+Corre el razonador (HermiT o Pellet, requieren Java) una sola vez sobre el
+.owx y guarda las tripletas inferidas (tipos de individuos, jerarquia de
+clases y, con infer_property_values, valores de propiedades de objeto) en el
+caché de indices, versionado por el hash de la ontologia. Si el hash no
+cambio, no se vuelve a razonar.
+
+Al cargar la ontologia, las inferencias se agregan a una ontologia aparte del
+mismo World, asi /searchClass, /search y /dlquery las ven pero nunca se
+escriben en el .owx al guardar las adiciones.
+
+Con el backend 'file' cada /addition reescribe el .owx y cambia su hash: el
+snapshot deja de aplicarse al reiniciar (se avisa al cargar) hasta volver a
+correr este script.
+
+    python reasoning.py [hermit|pellet] [--force]
+"""
+
+ONTOLOGY_PATH = Path(os.environ.get('ONTOLOGY_PATH', Path(__file__).parent.resolve().parent.parent/"resourse/ontology.owx"))
+REASONER = os.environ.get('ONTOLOGY_REASONER', 'hermit')
+# Ontologia donde owlready2 deja las inferencias (y donde las cargamos nosotros)
+INFERRED_IRI = "http://inferrences/"
+CACHE_NAME = 'inferred'
+
+def run(source_path=ONTOLOGY_PATH, reasoner=REASONER):
+    """
+    Reason over an ontology file in a private world.
+
+    Returns:
+        dict: 'reasoner', 'seconds' and 'triples', the inferred
+            (subject, predicate, object) IRIs.
+    """
+    world = World()
+    world.get_ontology(str(source_path)).load()
+
+    start = time.perf_counter()
+    if reasoner == 'pellet':
+        sync_reasoner_pellet(world, infer_property_values=True, debug=0)
+    elif reasoner == 'hermit':
+        sync_reasoner_hermit(world, infer_property_values=True, debug=0)
+    else:
+        raise ValueError(f"Razonador desconocido: {reasoner}")
+    seconds = time.perf_counter() - start
+
+    inferred = world.get_ontology(INFERRED_IRI)
+    triples = [(world._unabbreviate(s), world._unabbreviate(p), world._unabbreviate(o))
+               # Los nodos anonimos (storid negativo) no se pueden identificar entre worlds
+               for s, p, o in inferred._get_obj_triples_spo_spo(None, None, None) if s > 0 and o > 0]
+    return {'reasoner': reasoner, 'seconds': seconds, 'triples': triples}
+
+def build(source_path=ONTOLOGY_PATH, reasoner=REASONER, force=False):
+    """
+    Run the reasoner unless a snapshot for the current file content exists.
+
+    Returns:
+        tuple: (snapshot, True if the reasoner ran).
+    """
+    if not force:
+        snapshot = index_cache.load(CACHE_NAME, str(source_path))
+        if snapshot is not None:
+            return snapshot, False
+    snapshot = run(source_path, reasoner)
+    index_cache.store(CACHE_NAME, str(source_path), snapshot)
+    return snapshot, True
+
+def available(source_path=ONTOLOGY_PATH):
+    """True if there is a snapshot for the current content of the ontology file"""
+    return os.path.exists(index_cache.cache_file(CACHE_NAME, str(source_path)))
+
+def stale(source_path=ONTOLOGY_PATH):
+    """True if the only snapshot was built from an older content of the ontology file"""
+    return not available(source_path) and index_cache.exists(CACHE_NAME)
+
+def load(source_path=ONTOLOGY_PATH):
+    """Snapshot for the current content of the ontology file, or None (never runs the reasoner)"""
+    return index_cache.load(CACHE_NAME, str(source_path))
+
+def apply(ontologie, snapshot):
+    """
+    Add the inferred triples of a snapshot to the world of a loaded ontology.
+
+    Returns:
+        int: Number of triples added (those already present are skipped).
+    """
+    world = ontologie.world
+    inferred = world.get_ontology(INFERRED_IRI)
+    added = 0
+    for triple in snapshot['triples']:
+        storids = [world._abbreviate(iri, False) for iri in triple]
+        if None in storids or inferred._has_obj_triple_spo(*storids):
+            continue
+        inferred._add_obj_triple_spo(*storids)
+        added += 1
+    return added
+
+if __name__ == '__main__':
+    reasoner = next((arg for arg in sys.argv[1:] if not arg.startswith('--')), REASONER)
+    start = time.perf_counter()
+    try:
+        snapshot, ran = build(reasoner=reasoner, force='--force' in sys.argv)
+    except FileNotFoundError as e:
+        # owlready2 lanza el razonador con el ejecutable java
+        sys.exit(f"No se pudo ejecutar el razonador (¿Java instalado?): {e}")
+    if ran:
+        print(f"{snapshot['reasoner']}: {len(snapshot['triples'])} tripletas inferidas en {snapshot['seconds']:.1f}s "
+              f"({time.perf_counter() - start:.1f}s en total)")
+    else:
+        print(f"Snapshot de inferencias vigente ({len(snapshot['triples'])} tripletas, "
+              f"{snapshot['reasoner']}), usar --force para volver a razonar")
@@ -0,0 +1,103 @@
+import os
+import hashlib
+from functools import wraps
+
+from flask import Response, make_response, request
+
+import ontology
+import dbpedia
+import metrics
+from lru import LRUCache
+
+"""
+CACHE DE RESPUESTAS Y GET CONDICIONAL
+
+Las respuestas 200 de /search, /searchClass y /searchOffline se guardan ya
+serializadas, por (endpoint, parametros), junto con
+la version de los datos (ontology.version(), dbpedia.version()) con la que
+se calcularon. Mientras la version no cambie, repetir una busqueda es una
+consulta al LRU; una adicion o una recarga sube la version y las entradas
+viejas se recalculan en el siguiente pedido. Un parametro solo se normaliza
+con la misma funcion que le aplica la vista (la query de /search pasa por
+preprocess), asi dos pedidos comparten entrada solo si la vista no los
+distingue.
+
+Cada respuesta lleva un ETag (version + hash del cuerpo) y Cache-Control, y
+un If-None-Match que coincide se responde con 304 sin cuerpo.
+"""
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 4096))
+# Segundos que un cliente o proxy puede reusar una respuesta sin revalidar (0 = revalidar siempre)
+RESPONSE_MAX_AGE = int(os.environ.get('RESPONSE_MAX_AGE', 0))
+# Headers de la respuesta original que se guardan con el cuerpo
+KEPT_HEADERS = ('X-Next-Cursor',)
+
+_responses = LRUCache(RESPONSE_CACHE_SIZE)
+metrics.register_cache('responses', _responses.stats)
+
+def data_version():
+    """
+    Version of everything a cached response can depend on.
+    """
+    return ontology.version(), dbpedia.version()
+
+def cache_key(normalizers=None):
+    """
+    (endpoint, parameters) of the current request, with the parameters in
+    `normalizers` ({name: function}) replaced by their normalized value.
+    """
+    normalizers = normalizers or {}
+    args = []
+    for name, value in request.args.items(multi=True):
+        if name in normalizers:
+            value = normalizers[name](value)
+        args.append((name, value))
+    return request.endpoint, tuple(sorted(args))
+
+def cached(view=None, **normalizers):
+    """
+    Serve a GET view from the response cache, with ETag, Cache-Control
+    and If-None-Match -> 304.
+
+    `normalizers` maps parameter names to the function the view itself
+    applies to them (e.g. query=preprocess), so requests that the view
+    cannot tell apart share an entry. Use as @cached or @cached(query=f).
+    """
+    if view is None:
+        return lambda view: cached(view, **normalizers)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = data_version()
+        key = cache_key(normalizers)
+        entry = _responses.get(key)
+        if entry is None or entry[0] != version:
+            response = make_response(view(*args, **kwargs))
+            # Errores y streaming no se guardan
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = f"{version[0]}.{version[1]}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+            headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+            entry = (version, body, response.mimetype, headers, etag)
+            _responses.set(key, entry)
+
+        _, body, mimetype, headers, etag = entry
+        response = Response(body, mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        if RESPONSE_MAX_AGE:
+            response.cache_control.max_age = RESPONSE_MAX_AGE
+        else:
+            response.cache_control.no_cache = True
+        # 304 sin cuerpo si el cliente ya tiene esta version
+        return response.make_conditional(request)
+    return wrapper
+
+def clear():
+    """Drop every cached response"""
+    _responses.clear()
+
+def stats():
+    """Hits, misses and size of the response cache"""
+    return _responses.stats()
@@ -1,18 +1,11 @@
+import base64
+
 from owlready2 import *
 from preprocess import preprocess
 from translator import translate
 
-# Cache para traducciones en restructure
-_trans_cache = {}
-
-def cached_translate(text, dest='es'):
-    """Traducción con caché"""
-    if not text:
-        return text
-    key = (str(text), dest)
-    if key not in _trans_cache:
-        _trans_cache[key] = translate(text, dest)
-    return _trans_cache[key]
+# Campos de cada instancia en /searchClass (proyectables con fields=)
+INSTANCE_FIELDS = ("iri", "name_class", "name_individual", "properties", "sample_name", "name_individual_o")
 
 def struct_class(ontoClass):
     """
@@ -34,58 +27,150 @@ def struct_class(ontoClass):
             })
     return herarchy
 
-def struct_individuals(individual, classOntology, lang):
+def struct_individuals(individuals, classOntology, lang, memo=None, fields=None, depth=None):
     """
-    Retrieve instances of a specified class from the ontology and structure them into a list of dictionaries.
+    Structure individuals of a class into a list of dictionaries.
+
+    Parameters:
+        individuals (iterable): Individuals of `classOntology` to structure (e.g. one page).
+        classOntology (owlready2.entity.ThingClass): The class of the individuals.
+        lang (str): Language to translate the results.
+        memo (dict): (storid, depth) -> already structured property subtree, so
+            individuals shared between instances (or between calls) are built once.
+        fields (set): Keys of INSTANCE_FIELDS to include (None = all). Fields that
+            are not requested are neither built nor translated.
+        depth (int): Levels of nested properties to include (None = unlimited).
+
+    Returns:
+        list: One dictionary per individual with the requested fields.
     """
     instances = []
+    memo = {} if memo is None else memo
+    fields = INSTANCE_FIELDS if fields is None else fields
     # Cachear traducción del nombre de clase (solo una vez)
-    class_name_translated = cached_translate(preprocess(classOntology.name), dest=lang)
-
-    for individual in classOntology.instances():
-        nombre_prop = getNombreProp(individual, individual.get_properties())
-        nombre = nombre_prop[0] if nombre_prop and nombre_prop != "No se encontro" else individual.name
-
-        instances.append({
-            "iri" : individual.iri,
-            "name_class": class_name_translated,
-            "name_individual": cached_translate(preprocess(nombre), dest=lang),
-            "properties" : struct_properties(individual, lang),
-            "sample_name": individual.name,
-            "name_individual_o": nombre,
-        })
+    if "name_class" in fields:
+        class_name_translated = translate(preprocess(classOntology.name), dest=lang)
+
+    for individual in individuals:
+        if "name_individual" in fields or "name_individual_o" in fields:
+            nombre_prop = getNombreProp(individual, individual.get_properties())
+            nombre = nombre_prop[0] if nombre_prop and nombre_prop != "No se encontro" else individual.name
+
+        instance = {}
+        if "iri" in fields:
+            instance["iri"] = individual.iri
+        if "name_class" in fields:
+            instance["name_class"] = class_name_translated
+        if "name_individual" in fields:
+            instance["name_individual"] = translate(preprocess(nombre), dest=lang)
+        if "properties" in fields:
+            instance["properties"] = struct_properties(individual, lang, memo, depth=depth)
+        if "sample_name" in fields:
+            instance["sample_name"] = individual.name
+        if "name_individual_o" in fields:
+            instance["name_individual_o"] = nombre
+        instances.append(instance)
     return instances
 
-def struct_properties(ontoIndividual, lang):
+def struct_properties(ontoIndividual, lang, memo=None, visiting=None, depth=None, cuts=None):
     """
     Funcion recursiva para obtener todas las propiedades de una instancia de una clase
+
+    Los subárboles ya construidos se reutilizan desde `memo` y los ciclos se
+    cortan en el primer individuo repetido. Un subárbol cortado depende del
+    camino por el que se llego, asi que no se memoriza. Con `depth` solo se
+    construyen esa cantidad de niveles; las relaciones del ultimo nivel no
+    incluyen "properties".
     """
-    properties = ontoIndividual.get_properties() if ontoIndividual else None
-    herarchy = []
+    if not ontoIndividual or depth == 0:
+        return []
 
-    if properties == None:
+    memo = {} if memo is None else memo
+    visiting = set() if visiting is None else visiting
+    # Cantidad de ciclos cortados en esta construccion (compartida por la recursion)
+    cuts = [0] if cuts is None else cuts
+    key = (ontoIndividual.storid, depth)
+    if key in memo:
+        return memo[key]
+    if ontoIndividual.storid in visiting:
+        cuts[0] += 1
         return []
+    cuts_before = cuts[0]
+
+    properties = ontoIndividual.get_properties()
+    herarchy = []
+    visiting.add(ontoIndividual.storid)
+    sub_depth = None if depth is None else depth - 1
 
     for value in properties:
         if "object" in str.lower(str(type(value))):
             individual_temp = getattr(ontoIndividual, value.name, None)[0]
             nombre_prop = getNombreProp(individual_temp, individual_temp.get_properties())
             nombre = nombre_prop[0] if nombre_prop and nombre_prop != "No se encontro" else ""
-            herarchy.append({
-                "relationship" : {
-                    "iri" : value.iri,
-                    "name_object": cached_translate(preprocess(nombre), dest=lang),
-                    "properties": struct_properties(individual_temp, lang)
-                }})
+            relationship = {
+                "iri" : value.iri,
+                "name_object": translate(preprocess(nombre), dest=lang)
+            }
+            if sub_depth != 0:
+                relationship["properties"] = struct_properties(individual_temp, lang, memo, visiting, sub_depth, cuts)
+            herarchy.append({"relationship" : relationship})
         else:
             if "nombre" not in str(value.name):
                 prop_value = getattr(ontoIndividual, value.name, None)
                 if prop_value:
                     herarchy.append({
-                        value.name : cached_translate(preprocess(str(prop_value[0])), dest=lang)
+                        value.name : translate(preprocess(str(prop_value[0])), dest=lang)
                     })
+
+    visiting.discard(ontoIndividual.storid)
+    if cuts[0] == cuts_before:
+        memo[key] = herarchy
     return herarchy
 
+def paginate(individuals, limit=None, cursor=None):
+    """
+    Keyset pagination of individuals ordered by storid.
+
+    New individuals always get a higher storid, so a cursor stays valid
+    while the ontology grows.
+
+    Parameters:
+        individuals (iterable): Individuals to paginate.
+        limit (int): Page size (None = everything after the cursor).
+        cursor (str): Opaque cursor returned with the previous page.
+
+    Returns:
+        tuple: (page of individuals, cursor of the next page or None).
+    """
+    if limit is not None and limit < 1:
+        raise ValueError("'limit' debe ser mayor que 0")
+    individuals = sorted(individuals, key=lambda individual: individual.storid)
+    if cursor:
+        after = decode_cursor(cursor)
+        individuals = [individual for individual in individuals if individual.storid > after]
+    if limit is None or len(individuals) <= limit:
+        return individuals, None
+    page = individuals[:limit]
+    return page, encode_cursor(page[-1].storid)
+
+def encode_cursor(position: int):
+    """
+    Opaque cursor for an integer position.
+    """
+    return base64.urlsafe_b64encode(str(position).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """
+    Integer position of a cursor built by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
 def getNombreProp(individual, properties):
     """
     Retrieves the value of a property with "nombre" in its name from an individual's properties.
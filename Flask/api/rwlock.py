@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+class RWLock:
+    """
+    Readers-writer lock: many concurrent readers or a single writer.
+
+    Waiting writers block new readers, so a stream of requests cannot
+    starve an /addition.
+    """
+
+    def __init__(self):
+        self._cond = Condition(Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
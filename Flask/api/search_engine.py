@@ -0,0 +1,366 @@
+import os
+import numpy as np
+
+from threading import Lock
+from rapidfuzz import fuzz, process, utils
+
+from ngram_index import NGramIndex
+from payload_table import PayloadTable
+import metrics
+
+# Puntaje minimo para considerar un resultado (igual que el antiguo escaneo lineal)
+DEFAULT_SCORE_CUTOFF = 50.0
+# -1 usa todos los nucleos disponibles en rapidfuzz
+DEFAULT_WORKERS = -1
+# Fraccion de trigramas de la query que debe compartir un candidato (0 = escaneo completo).
+# El prefiltro es aproximado: partial_ratio da puntajes >= 50 a textos que no
+# comparten ningun trigrama con la query, y esos no llegan a puntuarse
+DEFAULT_MIN_OVERLAP = 0.1
+# Por debajo de este tamaño el escaneo completo es rapido y exacto
+DEFAULT_PREFILTER_MIN_SIZE = 5000
+# Si los candidatos del prefiltro dan menos hits que estos (o que los que pide
+# la pagina) se vuelve a puntuar todo el corpus
+FALLBACK_MIN_HITS = 20
+# Procesos para repartir el puntaje de consultas grandes sobre corpus mapeados
+# (0 = desactivado; cdist ya reparte en threads nativos dentro del proceso)
+SCORING_PROCESSES = int(os.environ.get('SCORING_PROCESSES', 0))
+POOL_MIN_CHOICES = int(os.environ.get('SCORING_POOL_MIN_CHOICES', 50000))
+
+class SearchEngine:
+    """
+    Fuzzy search engine over a contiguous corpus of preprocessed strings.
+
+    The corpus is normalized once with rapidfuzz's default processor. A query
+    first pulls candidates from a character trigram index and then scores
+    them in a single batched `process.cdist` call instead of a Python loop.
+
+    The trigram prefilter (corpora of `prefilter_min_size` entries or more)
+    is lossy: entries sharing too few trigrams with the query are never
+    scored. When the candidates yield fewer hits than the requested page
+    (or than FALLBACK_MIN_HITS without a limit) the whole corpus is scored
+    instead, so short or empty result lists are exact; full pages may
+    still miss low-overlap matches. Pass min_overlap=0 for exact results.
+
+    Parameters
+    ----------
+    corpus: list[str]
+        searchable strings, one per entry
+    payloads: list | PayloadTable
+        objects returned for each entry, aligned with `corpus`
+    score_cutoff: float
+        minimum partial_ratio score (0-100) for a hit
+    workers: int
+        threads used by rapidfuzz (-1 = all cores)
+    min_overlap: float
+        recall-vs-speed knob of the trigram prefilter (0 = brute-force scan)
+    prefilter_min_size: int
+        corpus size from which the prefilter is applied by default
+    keys: list | None
+        identifiers used by add/remove/update (defaults to the positions)
+
+    Entries can be added, removed or updated in place. Removed entries
+    leave an empty string behind, which never scores above the cutoff.
+    Mutations replace the corpus and payload lists instead of modifying
+    them, so concurrent searches keep scoring a consistent snapshot.
+
+    Engines opened from disk with corpus_store.open_engine() keep their
+    corpus memory-mapped (`store_path` is the store directory); entries
+    added later live in a small in-memory overlay on top of it.
+    """
+
+    store_path = None
+
+    def __init__(self, corpus, payloads, score_cutoff=DEFAULT_SCORE_CUTOFF, workers=DEFAULT_WORKERS,
+                 min_overlap=DEFAULT_MIN_OVERLAP, prefilter_min_size=DEFAULT_PREFILTER_MIN_SIZE, keys=None):
+        if len(corpus) != len(payloads):
+            raise ValueError("corpus and payloads must have the same length")
+        keys = range(len(corpus)) if keys is None else keys
+        self.score_cutoff = score_cutoff
+        self.workers = workers
+        self.min_overlap = min_overlap
+        self.prefilter_min_size = prefilter_min_size
+        # (corpus, payloads) se reemplaza entero en cada mutacion
+        self._entries = ([utils.default_process(str(s)) for s in corpus],
+                         payloads if isinstance(payloads, PayloadTable) else list(payloads))
+        self.ngrams = NGramIndex(self.corpus)
+        self._positions = {key: position for position, key in enumerate(keys)}
+        self._lock = Lock()
+
+    @property
+    def corpus(self):
+        return self._entries[0]
+
+    @property
+    def payloads(self):
+        return self._entries[1]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def add(self, key, text, payload):
+        """
+        Index a new entry (replacing any entry with the same key).
+        """
+        self.add_many([(key, text, payload)])
+
+    def add_many(self, items):
+        """
+        Index several (key, text, payload) entries, replacing entries with
+        the same key, with a single copy of the corpus and payloads.
+        """
+        with self._lock:
+            corpus, payloads = self._entries
+            removed, texts, added = [], [], []
+            for key, text, payload in items:
+                position = self._positions.pop(key, None)
+                if position is not None:
+                    if position < len(corpus):
+                        removed.append(position)
+                        self.ngrams.remove(position, corpus[position])
+                    else:
+                        # Clave repetida dentro del mismo lote
+                        self.ngrams.remove(position, texts[position - len(corpus)])
+                        texts[position - len(corpus)], added[position - len(corpus)] = '', None
+                text = utils.default_process(str(text))
+                self._positions[key] = self.ngrams.add(text)
+                texts.append(text)
+                added.append(payload)
+            self._entries = (edited(corpus, removed, texts, ''), edited(payloads, removed, added, None))
+
+    def remove(self, key):
+        """
+        Drop the entry with the given key, if any.
+        """
+        with self._lock:
+            self._remove(key)
+
+    def update(self, key, text, payload):
+        """
+        Replace the text and payload of an entry.
+        """
+        self.add(key, text, payload)
+
+    def _remove(self, key):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        corpus, payloads = self._entries
+        self.ngrams.remove(position, corpus[position])
+        self._entries = (edited(corpus, [position], (), ''), edited(payloads, [position], (), None))
+
+    def scores(self, query: str, min_overlap=None, corpus=None):
+        """
+        Score a query against the candidate entries of the corpus.
+
+        Parameters
+        ----------
+        query: str
+            preprocessed query
+        min_overlap: float | None
+            overrides the engine's trigram overlap threshold (0 = brute-force scan)
+        corpus: list[str] | None
+            snapshot of the corpus to score (defaults to the current one)
+
+        Returns
+        -------
+        tuple[numpy.ndarray, numpy.ndarray]
+            corpus positions and their scores (0 for entries below the cutoff)
+        """
+        query = utils.default_process(query or '')
+        corpus = self.corpus if corpus is None else corpus
+        if not query or not corpus:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        with metrics.span('index_lookup'):
+            ids = self.ngrams.candidates(query, self._min_overlap(min_overlap, corpus))
+        brute_force = ids is None
+        if brute_force:
+            ids = np.arange(len(corpus))
+        else:
+            # Entradas agregadas despues de tomar el snapshot del corpus
+            ids = ids[ids < len(corpus)]
+        if not len(ids):
+            return ids, np.empty(0, dtype=np.float32)
+
+        with metrics.span('scoring'):
+            # Corpus mapeado: los procesos del pool leen el mismo archivo (las adiciones locales se puntuan aca)
+            if getattr(corpus, 'directory', None) and SCORING_PROCESSES and len(ids) >= POOL_MIN_CHOICES:
+                from corpus_store import score_in_pool
+                return ids, score_in_pool(corpus, query, ids, self.score_cutoff, SCORING_PROCESSES)
+            choices = corpus if brute_force else take(corpus, ids)
+            return ids, process.cdist(
+                [query], choices,
+                scorer=fuzz.partial_ratio,
+                score_cutoff=self.score_cutoff,
+                workers=self.workers,
+            )[0]
+
+    def _min_overlap(self, min_overlap, corpus):
+        if min_overlap is None:
+            return self.min_overlap if len(corpus) >= self.prefilter_min_size else 0
+        return min_overlap
+
+    def _enough(self, scores, limit, offset):
+        # Hits suficientes para llenar la pagina pedida
+        needed = FALLBACK_MIN_HITS if limit is None else offset + limit
+        return np.count_nonzero(scores >= self.score_cutoff) >= needed
+
+    def search(self, query: str, limit=None, offset=0, min_overlap=None):
+        """
+        Ranked fuzzy search.
+
+        Parameters
+        ----------
+        query: str
+            preprocessed query
+        limit: int | None
+            maximum number of hits to return (None = all)
+        offset: int
+            number of ranked hits to skip
+        min_overlap: float | None
+            overrides the engine's trigram overlap threshold
+
+        Returns
+        -------
+        list[tuple]
+            (payload, score) pairs ordered by descending score
+        """
+        corpus, payloads = self._entries
+        ids, scores = self.scores(query, min_overlap, corpus)
+        if len(ids) < len(corpus) and self._min_overlap(min_overlap, corpus) and not self._enough(scores, limit, offset):
+            # El prefiltro pudo descartar hits reales: escaneo completo
+            ids, scores = self.scores(query, 0, corpus)
+        return rank(ids, scores, payloads, self.score_cutoff, limit, offset)
+
+    def search_many(self, queries, limit=None, offset=0, min_overlap=None):
+        """
+        Ranked fuzzy search of several queries in one scoring pass: a
+        single query x corpus cdist matrix when their trigram candidates
+        mostly overlap, one candidate scan per query otherwise.
+
+        Each query is still restricted to its own trigram candidates, so
+        the hits match what search() returns for that query alone.
+
+        Parameters
+        ----------
+        queries: list[str]
+            preprocessed queries (duplicates are scored once)
+        limit, offset, min_overlap:
+            as in search(), applied to every query
+
+        Returns
+        -------
+        list[list[tuple]]
+            (payload, score) pairs per query, aligned with `queries`
+        """
+        corpus, payloads = self._entries
+        processed = [utils.default_process(query or '') for query in queries]
+        unique = [query for query in dict.fromkeys(processed) if query]
+        if not unique or not corpus:
+            return [[] for _ in queries]
+
+        min_overlap = self._min_overlap(min_overlap, corpus)
+        with metrics.span('index_lookup'):
+            candidates = [self.ngrams.candidates(query, min_overlap) for query in unique]
+        if any(ids is None for ids in candidates):
+            # Alguna query no se puede filtrar: se puntua todo el corpus
+            columns = np.arange(len(corpus))
+            candidates = [columns if ids is None else ids[ids < len(corpus)] for ids in candidates]
+        else:
+            candidates = [ids[ids < len(corpus)] for ids in candidates]
+            columns = np.unique(np.concatenate(candidates))
+
+        if not len(columns):
+            return [[] for _ in queries]
+        texts = corpus if len(columns) == len(corpus) else take(corpus, columns)
+        pairs = sum(len(ids) for ids in candidates)
+        with metrics.span('scoring'):
+            if len(unique) * len(columns) <= 2 * pairs:
+                # Candidatos muy compartidos: matriz densa query x corpus
+                matrix = process.cdist(
+                    unique, texts,
+                    scorer=fuzz.partial_ratio,
+                    score_cutoff=self.score_cutoff,
+                    workers=self.workers,
+                )
+                rows = [matrix[row, np.searchsorted(columns, ids)] for row, ids in enumerate(candidates)]
+            else:
+                # Candidatos dispersos: cada query contra los suyos (cdist reutiliza
+                # la query preprocesada, mas rapido que puntuar pares sueltos)
+                texts = list(texts)
+                rows = [process.cdist(
+                    [query], [texts[j] for j in np.searchsorted(columns, ids).tolist()],
+                    scorer=fuzz.partial_ratio,
+                    score_cutoff=self.score_cutoff,
+                    workers=self.workers,
+                )[0] if len(ids) else np.empty(0, dtype=np.float32) for query, ids in zip(unique, candidates)]
+
+            # Queries con pocos hits entre sus candidatos: todas juntas contra el corpus completo
+            short = [row for row, (ids, scores) in enumerate(zip(candidates, rows))
+                     if min_overlap and len(ids) < len(corpus) and not self._enough(scores, limit, offset)]
+            if short:
+                matrix = process.cdist(
+                    [unique[row] for row in short], corpus,
+                    scorer=fuzz.partial_ratio,
+                    score_cutoff=self.score_cutoff,
+                    workers=self.workers,
+                )
+                for scores, row in zip(matrix, short):
+                    candidates[row], rows[row] = np.arange(len(corpus)), scores
+        ranked = {query: rank(ids, scores, payloads, self.score_cutoff, limit, offset)
+                  for query, ids, scores in zip(unique, candidates, rows)}
+        return [ranked.get(query, []) for query in processed]
+
+def edited(sequence, removed=(), appended=(), empty=None):
+    """
+    Copy of a corpus or payload sequence with the `removed` positions set
+    to `empty` and `appended` at the end, made in a single copy. Sequences
+    other than lists (PayloadTable, mapped corpora) implement `edited`.
+    """
+    if not isinstance(sequence, list):
+        return sequence.edited(removed, appended, empty)
+    sequence = sequence + list(appended)
+    for position in removed:
+        sequence[position] = empty
+    return sequence
+
+def take(sequence, ids):
+    """
+    Items of a list, or of a mapped sequence (corpus_store), at the positions `ids`.
+    """
+    if isinstance(sequence, list):
+        return [sequence[i] for i in ids]
+    return sequence[ids]
+
+def rank(ids, scores, payloads, score_cutoff, limit=None, offset=0):
+    """
+    Order the scored positions at or above the cutoff, applying limit/offset.
+    """
+    keep = scores >= score_cutoff
+    hits, hit_scores = ids[keep], scores[keep]
+    if hits.size == 0:
+        return []
+
+    offset = max(int(offset or 0), 0)
+    if limit is not None and offset + limit < hits.size:
+        # Solo ordenar los k mejores en vez de todos los hits
+        k = offset + max(int(limit), 0)
+        top = np.argpartition(-hit_scores, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.intp)
+        hits, hit_scores = hits[top], hit_scores[top]
+
+    # Empates se resuelven por posicion en el corpus
+    end = None if limit is None else offset + max(int(limit), 0)
+    order = np.lexsort((hits, -hit_scores))[offset:end]
+    return [(payloads[hits[j]], round(float(hit_scores[j]), 2)) for j in order]
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import subprocess
+
+"""
+SERVIDOR CON VARIOS PROCESOS
+
+Escribe una vez los indices de busqueda de la ontologia y de DBPedia como
+corpus mapeados en disco (corpus_store), y el autocompletado de cada idioma
+(suggest), y lanza N workers que comparten el
+mismo socket. Cada worker abre los corpus con mmap, asi las paginas quedan
+compartidas por el sistema operativo en vez de duplicar el indice en cada
+proceso, y las busquedas de distintos workers no compiten por el GIL.
+
+    python serve.py [--workers 4] [--host 127.0.0.1] [--port 5000]
+    python serve.py --build     (solo escribir los corpus y salir)
+
+Con gunicorn instalado se puede usar igual:
+
+    python serve.py --build && SEARCH_STORE=1 gunicorn -w 4 OntologyAPI:app
+
+Los corpus publicados no se modifican ni se borran mientras hay workers: las
+adiciones (/addition) se guardan en la ontologia y quedan como una capa en
+memoria del worker que atendio la peticion, que ademas marca el corpus como
+desactualizado. Los demas workers las ven al recargar (/reload,
+ONTOLOGY_WATCH_INTERVAL) o al reiniciar despues de un --build, que vuelve a
+escribir el corpus y borra los anteriores.
+"""
+
+def build_stores():
+    """
+    Write the mapped search corpora and prefix indexes in a separate process, so the
+    supervisor never loads the ontology itself.
+    """
+    # Unico proceso que reconstruye corpus desactualizados y borra los viejos
+    env = dict(os.environ, SEARCH_STORE='build')
+    subprocess.run([sys.executable, '-c', 'import ontology, dbpedia, suggest; suggest.write_stores()'],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True)
+
+def run_worker(sock):
+    os.environ['SEARCH_STORE'] = '1'
+    from werkzeug.serving import make_server
+    from OntologyAPI import app
+    server = make_server(*sock.getsockname()[:2], app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+def spawn(sock):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_worker(sock)
+        finally:
+            os._exit(1)
+    return pid
+
+def serve(host, port, workers):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    children = {spawn(sock) for _ in range(workers)}
+    print(f"{len(children)} workers escuchando en http://{host}:{port}")
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            # Worker caido: se reemplaza para mantener la cantidad pedida
+            print(f"Worker {pid} terminó (estado {status}), iniciando otro")
+            time.sleep(1)
+            children.add(spawn(sock))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve OntologyAPI with several processes sharing mapped search corpora')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--build', action='store_true', help='only write the mapped corpora')
+    args = parser.parse_args()
+
+    build_stores()
+    if args.build:
+        sys.exit(0)
+    if not hasattr(os, 'fork'):
+        # Windows: sin fork, un solo proceso (los corpus igual quedan mapeados)
+        os.environ['SEARCH_STORE'] = '1'
+        from OntologyAPI import app
+        app.run(host=args.host, port=args.port, threaded=True)
+    else:
+        serve(args.host, args.port, max(args.workers, 1))
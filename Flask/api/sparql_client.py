@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import requests
+
+from threading import BoundedSemaphore
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+from lru import LRUCache
+import metrics
+
+# Se puede apuntar a un endpoint local para pruebas sin conexion
+ENDPOINT = os.environ.get('DBPEDIA_ENDPOINT', "http://dbpedia.org/sparql")
+POOL_SIZE = int(os.environ.get('SPARQL_POOL_SIZE', 8))
+TIMEOUT = float(os.environ.get('SPARQL_TIMEOUT', 30))
+# Consultas simultaneas contra el endpoint, compartidas por todos los threads de Flask
+MAX_CONCURRENCY = int(os.environ.get('SPARQL_MAX_CONCURRENCY', POOL_SIZE))
+RETRIES = int(os.environ.get('SPARQL_RETRIES', 2))
+BACKOFF = float(os.environ.get('SPARQL_BACKOFF', 0.5))
+# Caché de respuestas por texto de consulta normalizado
+CACHE_TTL = float(os.environ.get('SPARQL_CACHE_TTL', 300))
+CACHE_SIZE = int(os.environ.get('SPARQL_CACHE_SIZE', 1024))
+
+# Errores transitorios que vale la pena reintentar
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class SPARQLClient:
+    """
+    SPARQL SELECT client over a pooled keep-alive HTTP session.
+
+    Each call builds its own request, so a single client can be shared by
+    every Flask worker thread. Transient failures are retried with
+    exponential backoff and responses are kept in a TTL cache keyed on the
+    normalized query text.
+
+    Parameters
+    ----------
+    endpoint: str
+        SPARQL endpoint URL
+    pool_size: int
+        maximum open connections
+    timeout: float
+        seconds to wait for each response
+    max_concurrency: int
+        maximum queries in flight at the same time
+    retries: int
+        extra attempts after a transient failure
+    backoff: float
+        seconds before the first retry, doubled on each attempt
+    cache_ttl: float
+        seconds a response stays cached (0 = no cache)
+    """
+
+    def __init__(self, endpoint=ENDPOINT, pool_size=POOL_SIZE, timeout=TIMEOUT, max_concurrency=MAX_CONCURRENCY,
+                 retries=RETRIES, backoff=BACKOFF, cache_ttl=CACHE_TTL, cache_size=CACHE_SIZE):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = LRUCache(cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+        self._slots = BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept'] = 'application/sparql-results+json'
+        self._executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    def select(self, query: str, cache=True):
+        """
+        Run a SELECT query.
+
+        Parameters
+        ----------
+        query: str
+            SPARQL query text
+        cache: bool
+            serve and store the response through the TTL cache
+
+        Returns
+        -------
+        list[dict]
+            the `results.bindings` of the SPARQL JSON response
+        """
+        key = normalize(query)
+        if cache and self.cache is not None:
+            bindings = self.cache.get(key)
+            if bindings is not None:
+                return bindings
+
+        bindings = self._post(query)['results']['bindings']
+        if cache and self.cache is not None:
+            self.cache.set(key, bindings)
+        return bindings
+
+    def _post(self, query):
+        for attempt in range(self.retries + 1):
+            try:
+                with self._slots, metrics.span('sparql'):
+                    response = self.session.post(self.endpoint, data={'query': query}, timeout=self.timeout)
+                if response.status_code not in _RETRY_STATUS or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def select_many(self, queries):
+        """
+        Run several SELECT queries concurrently.
+
+        Returns
+        -------
+        list[list[dict]]
+            bindings of each query, in the same order as `queries`
+        """
+        return list(self._executor.map(self.select, queries))
+
+def normalize(query: str):
+    """
+    Collapse whitespace so equivalent query texts share a cache entry.
+    """
+    return re.sub(r'\s+', ' ', query).strip()
+
+def literal(value: str, lang=None):
+    """
+    Quote a string as a SPARQL literal, optionally with a language tag.
+    """
+    value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{value}"@{lang}' if lang else f'"{value}"'
+
+client = SPARQLClient()
+if client.cache is not None:
+    metrics.register_cache('dbpedia_sparql', client.cache.stats)
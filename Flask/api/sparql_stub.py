@@ -0,0 +1,90 @@
+import re
+import json
+import time
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+ENDPOINT SPARQL FALSO
+
+Servidor HTTP local que reemplaza al endpoint de DBPedia en el benchmark y
+en los tests (DBPEDIA_ENDPOINT o sparql_client.client.endpoint), asi
+/addition se puede ejecutar sin red. Responde lo justo para storeData:
+
+    consulta de verificate_name    `labels` como nombres
+    consultas VALUES ?label        una enfermedad por etiqueta pedida
+
+Guarda el texto de cada consulta recibida, para contar viajes al endpoint.
+"""
+
+class FakeSPARQLHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the DBPedia endpoint, enough for /addition:
+    the verificate_name query gets `labels` back as names, and the VALUES
+    queries of storeData get one disease binding per requested label.
+    """
+
+    labels = []
+    latency = 0.0
+    queries = None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        query = parse_qs(self.rfile.read(length).decode('utf-8')).get('query', [''])[0]
+        if self.queries is not None:
+            self.queries.append(query)
+        if 'VALUES ?label' in query:
+            bindings = [{
+                'label': {'type': 'literal', 'value': label, 'xml:lang': 'en'},
+                'entity': {'type': 'uri', 'value': 'http://dbpedia.org/resource/' + label.replace(' ', '_')},
+                'name': {'type': 'literal', 'value': label},
+                'comment': {'type': 'literal', 'value': f"{label} is a disease."},
+                'type': {'type': 'literal', 'value': 'disease'}
+            } for label in re.findall(r'"((?:[^"\\]|\\.)*)"@en', query)]
+        else:
+            bindings = [{'name': {'type': 'literal', 'value': label}} for label in self.labels]
+        time.sleep(self.latency)
+        body = json.dumps({'head': {'vars': []}, 'results': {'bindings': bindings}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/sparql-results+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeEndpoint:
+    """
+    Runs FakeSPARQLHandler in a background thread while the context is open.
+
+    Parameters
+    ----------
+    labels: list[str]
+        names returned to verificate_name
+    latency: float
+        seconds to wait before each response
+    """
+
+    def __init__(self, labels, latency=0.0):
+        self.labels = list(labels)
+        self.latency = latency
+        self.queries = []
+        self.url = None
+
+    def __enter__(self):
+        handler = type('Handler', (FakeSPARQLHandler,),
+                       {'labels': self.labels, 'latency': self.latency, 'queries': self.queries})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, name='fake-sparql', daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/sparql"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def values_queries(self):
+        """Queries received with a VALUES ?label block (storeData round-trips)"""
+        return [query for query in self.queries if 'VALUES ?label' in query]
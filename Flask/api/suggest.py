@@ -0,0 +1,284 @@
+import os
+import json
+import glob
+import shutil
+import hashlib
+from bisect import bisect_left
+from threading import Lock, Thread
+
+import numpy as np
+
+import ontology
+import dbpedia
+import dbpedia_snapshot
+import index_cache
+import corpus_store
+import metrics
+from translator import translate_many
+from preprocess import normalize
+
+"""
+AUTOCOMPLETADO (/suggest)
+
+Por idioma se arma un arreglo ordenado de claves normalizadas (minusculas,
+sin tildes) con una entrada por cada palabra de cada nombre, asi "pulm"
+sugiere "Cancer de pulmon". Un prefijo es un rango del arreglo que se
+encuentra con dos busquedas binarias, y de ese rango se eligen las k
+sugerencias de mayor peso:
+
+    clases        cantidad de individuos indexados de la clase
+    individuos    1 (nombre y sample_name)
+    DBPedia       0.5 (etiquetas del snapshot, en ingles)
+
+Los nombres de la ontologia se traducen a cada idioma con el caché de
+traducciones. Solo hay arreglos para SUGGEST_LANGS (otro idioma usa el
+primero); se construyen al iniciar y, cuando cambian los datos (adiciones o
+recargas), se rehacen en un thread mientras se sigue respondiendo con los
+anteriores.
+
+Con serve.py el constructor los escribe en el caché de indices con el mismo
+formato que corpus_store ({idioma}/keys, items, posiciones y pesos), por el
+par de corpus mapeados de los que salieron, y los workers los abren con mmap
+en vez de armar cada uno su copia.
+"""
+
+SUGGEST_LANGS = [lang.strip() for lang in os.environ.get('SUGGEST_LANGS', 'es,en').split(',') if lang.strip()] or ['es']
+DEFAULT_K = 10
+MAX_K = 50
+
+CLASS_WEIGHT_MIN = 1.0
+INDIVIDUAL_WEIGHT = 1.0
+DBPEDIA_WEIGHT = 0.5
+
+class PrefixIndex:
+    """
+    Sorted array of normalized keys for prefix lookups.
+
+    Parameters
+    ----------
+    items: list[dict]
+        suggestions ({'text', 'type', ...}) with their 'weight'
+    """
+
+    def __init__(self, items):
+        rows = []
+        for position, item in enumerate(items):
+            words = normalize(item['text']).split()
+            # Una clave por cada palabra inicial posible: "cancer de pulmon", "de pulmon", "pulmon"
+            for start in range(len(words)):
+                rows.append((' '.join(words[start:]), position))
+        rows.sort()
+        self.keys = [key for key, _ in rows]
+        self.positions = np.fromiter((position for _, position in rows), dtype=np.int64, count=len(rows))
+        self.weights = np.fromiter((items[position]['weight'] for _, position in rows), dtype=np.float64, count=len(rows))
+        self.items = items
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Prefix index written with write(), memory-mapped.
+        """
+        index = cls.__new__(cls)
+        index.keys = corpus_store.MappedStrings(directory, 'keys')
+        index.positions = np.load(os.path.join(directory, 'positions.npy'), mmap_mode='r')
+        index.weights = np.load(os.path.join(directory, 'weights.npy'), mmap_mode='r')
+        index.items = corpus_store.MappedJSON(directory, 'items')
+        return index
+
+    def write(self, directory):
+        """
+        Write the index in the mapped format (atomically: tmp dir + rename).
+        """
+        tmp = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        corpus_store.write_strings(tmp, 'keys', self.keys)
+        corpus_store.write_strings(tmp, 'items', [json.dumps(item, ensure_ascii=False) for item in self.items])
+        np.save(os.path.join(tmp, 'positions.npy'), np.asarray(self.positions, dtype=np.int64))
+        np.save(os.path.join(tmp, 'weights.npy'), np.asarray(self.weights, dtype=np.float64))
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # Ya lo publico otro proceso
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def __len__(self):
+        return len(self.items)
+
+    def lookup(self, prefix, k=DEFAULT_K):
+        """
+        Top-k suggestions whose name (or a word of it) starts with `prefix`,
+        by descending weight, then shortest and alphabetical.
+        """
+        prefix = normalize(prefix)
+        if not prefix or k <= 0:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        if lo == hi:
+            return []
+
+        weights = self.weights[lo:hi]
+        # Varias claves pueden ser del mismo nombre (o nombres repetidos): pedir de mas y deduplicar
+        wanted = min(hi - lo, 4 * k)
+        top = np.argpartition(-weights, wanted - 1)[:wanted] if wanted < hi - lo else np.arange(hi - lo)
+        top = sorted(top.tolist(), key=lambda i: (-weights[i], len(self.keys[lo + i]), self.keys[lo + i]))
+
+        suggestions, seen = [], set()
+        for i in top:
+            item = self.items[int(self.positions[lo + i])]
+            text = item['text'].casefold()
+            if text in seen:
+                continue
+            seen.add(text)
+            suggestions.append(item)
+            if len(suggestions) == k:
+                break
+        return suggestions
+
+# idioma -> (version de los datos, PrefixIndex)
+_indexes = {}
+# Idiomas con una reconstruccion en curso
+_building = set()
+_lock = Lock()
+metrics.register_cache('suggest', lambda: {'size': len(_indexes), 'building': len(_building)})
+
+def _source_version():
+    # Cambia con cada adicion, recarga de la ontologia o del indice de DBPedia
+    return ontology.version(), dbpedia.version()
+
+def store_path(lang):
+    """
+    Directory of the mapped prefix index of a language for the current
+    mapped search corpora, or None if they are not mapped (or were edited).
+    """
+    stores = (corpus_store.mapped_store(ontology.build_search_index()),
+              corpus_store.mapped_store(dbpedia.build_dbpedia_index()))
+    if None in stores:
+        return None
+    key = hashlib.blake2b('|'.join([lang] + [os.path.basename(store) for store in stores]).encode(),
+                          digest_size=8).hexdigest()
+    return os.path.join(index_cache.CACHE_DIR, f"suggest-v{index_cache.CACHE_VERSION}-{key}.store")
+
+def build(lang):
+    """
+    Prefix index of one language, from the current ontology index and DBPedia snapshot.
+    """
+    search_index = ontology.build_search_index()
+    entries = [entry for entry in search_index.payloads if entry is not None]
+
+    counts = {}
+    for entry in entries:
+        class_name = entry['class_name'].split('.')[-1]
+        counts[class_name] = counts.get(class_name, 0) + 1
+
+    items = []
+    for class_name in ontology.name_classes:
+        items.append({'text': class_name.replace('_', ' '), 'type': 'class', 'value': class_name,
+                      'weight': max(CLASS_WEIGHT_MIN, counts.get(class_name, 0))})
+    for entry in entries:
+        items.append({'text': entry['nombre'], 'type': 'individual', 'iri': entry['iri'], 'weight': INDIVIDUAL_WEIGHT})
+        if entry['sample_name'] != entry['nombre']:
+            items.append({'text': entry['sample_name'].replace('_', ' '), 'type': 'individual', 'iri': entry['iri'],
+                          'weight': INDIVIDUAL_WEIGHT})
+
+    if lang != 'es':
+        # La ontologia esta en español: traducir los textos (caché de traducciones)
+        translations = translate_many([item['text'] for item in items], lang)
+        for item, text in zip(items, translations):
+            item['text'] = text
+
+    for disease in dbpedia_snapshot.load_snapshot():
+        if disease.get('label'):
+            items.append({'text': disease['label'], 'type': 'dbpedia', 'iri': disease['iri'], 'weight': DBPEDIA_WEIGHT})
+
+    return PrefixIndex(items)
+
+def load(lang):
+    """
+    Prefix index of one language: the mapped one written by the constructor
+    if there is one for the current data, else built in memory.
+    """
+    directory = store_path(lang)
+    if directory is not None and os.path.isdir(directory):
+        return PrefixIndex.open(directory)
+    return build(lang)
+
+def write_stores(langs=SUGGEST_LANGS):
+    """
+    Write the mapped prefix indexes of `langs` for the current mapped
+    corpora and remove older ones (serve.py constructor).
+    """
+    current = set()
+    for lang in langs:
+        directory = store_path(lang)
+        if directory is None:
+            return
+        if not os.path.isdir(directory):
+            build(lang).write(directory)
+        current.add(directory)
+    for old in glob.glob(os.path.join(index_cache.CACHE_DIR, 'suggest-v*.store')):
+        if old not in current:
+            shutil.rmtree(old, ignore_errors=True)
+
+def get_index(lang):
+    """
+    Prefix index of a language. Only the first request waits for it; when
+    the data changes the old index keeps answering while a new one is
+    built in the background.
+    """
+    if lang not in SUGGEST_LANGS:
+        lang = SUGGEST_LANGS[0]
+    cached = _indexes.get(lang)
+    if cached is None:
+        with _lock:
+            cached = _indexes.get(lang)
+            if cached is None:
+                version = _source_version()
+                cached = _indexes[lang] = (version, load(lang))
+    if cached[0] != _source_version():
+        _rebuild_in_background(lang)
+    return cached[1]
+
+def _rebuild_in_background(lang):
+    with _lock:
+        if lang in _building:
+            return
+        _building.add(lang)
+
+    def run():
+        try:
+            # Si los datos cambian mientras se construye, se vuelve a construir
+            while _indexes[lang][0] != _source_version():
+                version = _source_version()
+                _indexes[lang] = (version, load(lang))
+        except Exception as e:
+            print(f"No se pudo reconstruir el autocompletado ({lang}): {e}")
+        finally:
+            with _lock:
+                _building.discard(lang)
+    Thread(target=run, name=f'suggest-{lang}', daemon=True).start()
+
+def suggest(prefix, lang='es', k=DEFAULT_K):
+    """
+    Autocomplete suggestions for a prefix.
+
+    Returns:
+        list: {'text', 'type', 'iri' | 'value', 'weight'} dicts, best first.
+    """
+    with metrics.span('suggest'):
+        return get_index(lang).lookup(prefix, min(max(int(k), 0), MAX_K))
+
+def warm_up(langs=SUGGEST_LANGS):
+    """
+    Build the prefix indexes of `langs` in a background thread.
+    """
+    def run():
+        for lang in langs:
+            try:
+                get_index(lang)
+            except Exception as e:
+                print(f"No se pudo construir el autocompletado ({lang}): {e}")
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,54 @@
+import os
+import sys
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+"""
+CONFIGURACION COMUN DE LOS TESTS
+
+Los modulos de la API se importan como en OntologyAPI.py (desde Flask/api).
+Antes de importar cualquier modulo, la ontologia se copia a un directorio
+temporal (las adiciones de los tests no tocan resourse/), los caches de
+indices y de traducciones van ahi tambien y las traducciones no salen a la
+red.
+"""
+
+API_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(API_DIR))
+
+_tmp = tempfile.mkdtemp(prefix='ontology-api-tests-')
+if 'DBPEDIA_SNAPSHOT_PATH' not in os.environ:
+    # Snapshot chico para no generarlo desde el endpoint
+    os.environ['DBPEDIA_SNAPSHOT_PATH'] = os.path.join(_tmp, 'dbpedia.jsonl')
+    with open(os.environ['DBPEDIA_SNAPSHOT_PATH'], 'w', encoding='utf-8') as f:
+        for label in ('Leukemia', 'Lung cancer', 'Breast cancer', 'Melanoma', 'Carcinoma'):
+            iri = 'http://dbpedia.org/resource/' + label.replace(' ', '_')
+            f.write(f'{{"iri": "{iri}", "label": "{label}", "name": "{label.lower()}"}}\n')
+if 'ONTOLOGY_PATH' not in os.environ:
+    os.environ['ONTOLOGY_PATH'] = shutil.copy(API_DIR.parent.parent / 'resourse/ontology.owx', _tmp)
+os.environ.setdefault('INDEX_CACHE_DIR', os.path.join(_tmp, 'index_cache'))
+os.environ.setdefault('TRANSLATION_CACHE_PATH', os.path.join(_tmp, 'translations.sqlite3'))
+os.environ.setdefault('TRANSLATION_OFFLINE', '1')
+
+@pytest.fixture
+def fake_sparql(monkeypatch):
+    """
+    Start a local FakeEndpoint serving the given labels and point the shared
+    SPARQL client at it, without its response cache.
+    """
+    from sparql_client import client
+    from sparql_stub import FakeEndpoint
+    endpoints = []
+
+    def start(labels):
+        endpoint = FakeEndpoint(labels).__enter__()
+        endpoints.append(endpoint)
+        monkeypatch.setattr(client, 'endpoint', endpoint.url)
+        monkeypatch.setattr(client, 'cache', None)
+        return endpoint
+    yield start
+    for endpoint in endpoints:
+        endpoint.__exit__(None, None, None)
@@ -0,0 +1,76 @@
+import pytest
+
+from restructure import encode_cursor
+
+@pytest.fixture(scope='module')
+def client():
+    from OntologyAPI import app
+    return app.test_client()
+
+@pytest.mark.parametrize('url', [
+    '/searchClass?query=Cancer&lang=es&limit=0',
+    '/search?query=cancer&lang=es&limit=0',
+    '/search?query=cancer&lang=es&limit=-5',
+    '/search?query=cancer&lang=es&offset=-1',
+    f'/search?query=cancer&lang=es&limit=10&cursor={encode_cursor(-1)}',
+    '/searchStream?query=cancer&limit=0',
+    '/dlquery?query=Cancer&limit=0',
+    '/sparql?query=SELECT%20*%20WHERE%20%7B%3Fs%20%3Fp%20%3Fo%7D&limit=-1',
+])
+def test_invalid_pages_are_rejected(client, url):
+    assert client.get(url).status_code == 400
+
+@pytest.mark.parametrize('body', [
+    {'queries': ['cancer'], 'limit': 0},
+    {'queries': ['cancer'], 'offset': -1},
+    {'queries': ['cancer'], 'fields': 5},
+    {'queries': ['cancer'], 'fields': {'iri': True}},
+    {'queries': ['cancer'], 'fields': ['iri', 3]},
+    {'queries': ['cancer'], 'fields': [None]},
+    {'queries': ['cancer'], 'limit': True},
+    {'queries': ['cancer'], 'offset': False},
+    {'queries': ['cancer'], 'lang': ['en']},
+])
+def test_invalid_batch_bodies_are_rejected(client, body):
+    assert client.post('/search/batch', json=body).status_code == 400
+
+def test_class_pages(client):
+    response = client.get('/searchClass?query=Cancer&lang=es&limit=1')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
+    assert response.headers.get('X-Next-Cursor')
+
+def test_batch_fields(client):
+    for fields in ('iri,score', ['iri', 'score']):
+        response = client.post('/search/batch', json={'queries': ['cancer'], 'limit': 2, 'fields': fields})
+        assert response.status_code == 200
+        hits = [hit for hits in response.get_json()[0]['results'].values() for hit in hits]
+        assert hits and all(set(hit) <= {'iri', 'score'} for hit in hits)
+
+def test_cache_key_normalizes_only_what_the_view_ignores(client):
+    from OntologyAPI import app
+    from preprocess import preprocess
+    import response_cache
+
+    def key(url, **normalizers):
+        with app.test_request_context(url):
+            return response_cache.cache_key(normalizers)
+    # /searchClass distingue mayúsculas en su parámetro: entradas separadas
+    assert key('/searchClass?query=cancer&lang=es') != key('/searchClass?query=Cancer&lang=es')
+    # /search solo ve la query preprocesada
+    assert key('/search?query=Cancer%20de%20pulmon&lang=es', query=preprocess) == \
+        key('/search?query=cancer%20de%20pulmon&lang=es', query=preprocess)
+
+def test_stream_sends_the_raw_query_online(client, monkeypatch):
+    import OntologyAPI
+    queries = []
+    monkeypatch.setattr(OntologyAPI, 'search_dbpedia_online', lambda query, lang: queries.append(query) or [])
+    response = client.get('/searchStream?query=Cancers%20de%20pulmon&online=1')
+    assert response.get_data(as_text=True).endswith('{"done": true}\n')
+    assert queries == ['Cancers de pulmon']
+
+def test_batch_reports_queries_without_hits(client):
+    response = client.post('/search/batch', json={'queries': ['cancer', 'zzqxv'], 'limit': 2})
+    first, second = response.get_json()
+    assert 'No existen busquedas encontradas' not in first['results']
+    assert second['results'] == {'No existen busquedas encontradas': []}
@@ -0,0 +1,52 @@
+import math
+import threading
+
+import pytest
+
+import dbpedia
+import ontology
+
+def test_reload_keeps_serving_the_previous_index(monkeypatch):
+    old = dbpedia.build_dbpedia_index()
+    version = dbpedia.version()
+    building = threading.Event()
+    release = threading.Event()
+    load = dbpedia._load_dbpedia_index
+
+    def slow_load():
+        building.set()
+        release.wait(10)
+        return load()
+    monkeypatch.setattr(dbpedia, '_load_dbpedia_index', slow_load)
+
+    reload = threading.Thread(target=dbpedia.reload_dbpedia_index)
+    reload.start()
+    assert building.wait(10)
+    # Durante la recarga el índice sigue disponible y la versión no cambia
+    assert dbpedia.build_dbpedia_index() is old
+    assert dbpedia.status() == {'dbpedia_index': True}
+    assert dbpedia.version() == version
+    release.set()
+    reload.join(10)
+    assert dbpedia.build_dbpedia_index() is not old
+    assert dbpedia.version() == version + 1
+
+@pytest.mark.parametrize('count, batch_size', [(1, 20), (20, 20), (21, 20), (45, 20), (45, 7)])
+def test_store_data_batches_values_queries(monkeypatch, fake_sparql, count, batch_size):
+    labels = [f"storedata{count}x{batch_size} carcinoma {i}" for i in range(count)]
+    monkeypatch.setattr(dbpedia, 'STORE_BATCH_SIZE', batch_size)
+    endpoint = fake_sparql(labels)
+    dbpedia.storeData(f"storedata{count}x{batch_size}", 'en')
+    assert len(endpoint.values_queries()) == math.ceil(count / batch_size)
+    # Cada etiqueta se pide una sola vez y todas quedan indexadas
+    requested = [label for query in endpoint.values_queries() for label in labels if f'"{label}"@en' in query]
+    assert sorted(requested) == sorted(labels)
+    assert set(labels) <= {entry['nombre'] for entry in ontology.build_search_index().payloads if entry}
+
+def test_missing_snapshot_is_built_without_waiting(monkeypatch, tmp_path):
+    import dbpedia_snapshot
+    path = tmp_path / 'dbpedia.jsonl'
+    built = threading.Event()
+    monkeypatch.setattr(dbpedia_snapshot, 'build_snapshot', lambda path: built.set())
+    dbpedia_snapshot.start_refresh(3600, lambda: None, str(path))
+    assert built.wait(5)
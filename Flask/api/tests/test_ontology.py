@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import subprocess
+
+from conftest import API_DIR
+
+SEARCH_KEYS = "import json, ontology; print(json.dumps(sorted(ontology.search('cancer'))))"
+
+def search_keys(tmp_path, **env):
+    env = dict(os.environ, INDEX_CACHE_DIR=str(tmp_path / 'index_cache'), **env)
+    output = subprocess.run([sys.executable, '-c', SEARCH_KEYS], cwd=API_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def test_result_classes_do_not_depend_on_backend(tmp_path):
+    file_keys = search_keys(tmp_path, ONTOLOGY_BACKEND='file')
+    sqlite_keys = search_keys(tmp_path, ONTOLOGY_BACKEND='sqlite',
+                              ONTOLOGY_QUADSTORE=str(tmp_path / 'ontology.sqlite3'))
+    assert 'ontology.owx.Cancer' in file_keys
+    assert sqlite_keys == file_keys
+
+def test_addition_takes_the_ontology_under_the_write_lock(monkeypatch):
+    import ontology
+    held = []
+    get_ontologie = ontology.get_ontologie
+
+    def recording():
+        held.append(ontology.ontology_lock._writing)
+        return get_ontologie()
+    monkeypatch.setattr(ontology, 'get_ontologie', recording)
+    item = {'type': {'value': 'disease'}, 'name': {'value': 'lockcheck carcinoma'},
+            'comment': {'value': 'lockcheck carcinoma is a disease.'}}
+    ontology.store_in_ontology([item], 'lockcheck')
+    assert held and all(held)
+
+def test_class_name_is_translated_outside_the_read_lock(monkeypatch):
+    import ontology
+    import class_catalogue
+    readers = []
+
+    def translate(text, dest):
+        readers.append(ontology.ontology_lock._readers)
+        return 'Cancer'
+    monkeypatch.setattr(class_catalogue, 'translate', translate)
+    class_catalogue.invalidate()
+    assert ontology.classes('Unknown disease name')['name'] == 'Cancer'
+    ontology.getInstancesByClass('Another unknown name', 'es', depth=0, limit=1)
+    assert readers == [0, 0]
+
+def test_inferred_snapshot_of_an_older_file_is_stale(tmp_path, monkeypatch):
+    import index_cache
+    import reasoning
+    monkeypatch.setattr(index_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    owx = tmp_path / 'ontology.owx'
+    owx.write_text('<Ontology/>')
+    assert not reasoning.stale(str(owx))
+    index_cache.store(reasoning.CACHE_NAME, str(owx), {'reasoner': 'hermit', 'seconds': 0, 'triples': []})
+    assert reasoning.available(str(owx)) and not reasoning.stale(str(owx))
+    owx.write_text('<Ontology><!-- /addition --></Ontology>')
+    assert reasoning.stale(str(owx))
+
+def test_removal_invalidates_the_cached_index(monkeypatch):
+    import ontology
+    import corpus_store
+    name = ontology.search_index_name()
+    ontology.index_cache.store(name, str(ontology.path), 'cached index')
+    stale = []
+    monkeypatch.setattr(corpus_store, 'mark_stale', lambda *args: stale.append(args))
+    ontology.remove_individual(ontology.ONTOLOGY_IRI + 'not_an_individual')
+    assert ontology.index_cache.load(name, str(ontology.path)) is None
+    assert stale == [(name, str(ontology.path))]
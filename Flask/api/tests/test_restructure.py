@@ -0,0 +1,51 @@
+import restructure
+import materialize
+
+class ObjectProperty:
+    def __init__(self, name):
+        self.name = name
+        self.iri = 'http://example.org/' + name
+
+class Individual:
+    def __init__(self, storid, *relations):
+        self.storid = storid
+        self.relations = relations
+
+    def get_properties(self):
+        return [ObjectProperty(f'rel{i}') for i in range(len(self.relations))]
+
+    def __getattr__(self, name):
+        if name.startswith('rel'):
+            return [self.relations[int(name[3:])]]
+        raise AttributeError(name)
+
+class Class:
+    name = 'Empty'
+
+    def instances(self):
+        return []
+
+def test_subtree_cut_at_a_cycle_is_not_memoized(monkeypatch):
+    monkeypatch.setattr(restructure, 'translate', lambda text, dest: text)
+    monkeypatch.setattr(restructure, 'preprocess', lambda text: text)
+    # a -> b -> a: desde a, el subárbol de b se corta en a
+    a = Individual(1)
+    b = Individual(2, a)
+    a.relations = (b,)
+    memo = {}
+    restructure.struct_properties(a, 'es', memo)
+    assert (b.storid, None) not in memo
+    assert restructure.struct_properties(b, 'es', memo) == restructure.struct_properties(b, 'es')
+
+def test_languages_kept_are_bounded(monkeypatch):
+    monkeypatch.setattr(materialize, 'MAX_LANGS', 2)
+    monkeypatch.setattr(materialize, 'MAX_RESPONSES', 3)
+    materialize.invalidate()
+    try:
+        for lang in ('es', 'en', 'fr', 'de', 'xx'):
+            materialize.get_instances(Class(), lang)
+        assert len(materialize._subtrees) == 2
+        assert materialize.stats()['size'] == 3
+    finally:
+        monkeypatch.undo()
+        materialize.invalidate()
@@ -0,0 +1,47 @@
+import pytest
+
+import search_engine
+from search_engine import SearchEngine
+
+# Queries donde el prefiltro de trigramas pierde hits reales en la ontologia incluida
+QUERIES = ['leucemia', 'brocoli', 'biopsia', 'pulmon', 'manzanilla', 'dolor de cabeza', 'cancer']
+
+@pytest.fixture(scope='module')
+def prefiltered():
+    """Engine over the bundled ontology index with the trigram prefilter always applied"""
+    import ontology
+    corpus, payloads = ontology.build_search_index()._entries
+    return SearchEngine(list(corpus), list(payloads), prefilter_min_size=0)
+
+def brute_force(engine, query, **kwargs):
+    return engine.search(query, min_overlap=0, **kwargs)
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_default_engine_is_exact_on_small_corpora(query):
+    import ontology
+    engine = ontology.build_search_index()
+    assert len(engine) < search_engine.DEFAULT_PREFILTER_MIN_SIZE
+    assert engine.search(query) == brute_force(engine, query)
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_prefiltered_hits_are_real_hits(prefiltered, query):
+    exact = {entry['iri']: score for entry, score in brute_force(prefiltered, query)}
+    for limit in (None, 5, 10):
+        for entry, score in prefiltered.search(query, limit=limit):
+            assert exact[entry['iri']] == score
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_prefilter_never_returns_short_pages(prefiltered, query):
+    total = len(brute_force(prefiltered, query))
+    for limit, offset in ((5, 0), (10, 0), (10, 10), (50, 0)):
+        hits = prefiltered.search(query, limit=limit, offset=offset)
+        assert len(hits) == max(0, min(limit, total - offset))
+
+def test_prefilter_falls_back_to_brute_force(prefiltered):
+    # biopsia solo tiene 5 hits entre sus candidatos de trigramas (44 en total)
+    assert prefiltered.search('biopsia') == brute_force(prefiltered, 'biopsia')
+    assert len(prefiltered.search('biopsia')) > search_engine.FALLBACK_MIN_HITS
+
+def test_search_many_matches_search(prefiltered):
+    for limit in (None, 10):
+        assert prefiltered.search_many(QUERIES, limit=limit) == [prefiltered.search(query, limit=limit) for query in QUERIES]
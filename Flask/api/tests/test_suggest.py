@@ -0,0 +1,29 @@
+import time
+
+import ontology
+import suggest
+
+def wait_for_rebuilds(timeout=60):
+    deadline = time.monotonic() + timeout
+    while suggest._building and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+def test_unknown_languages_use_the_default_index():
+    # Adiciones de otros tests dejan el indice viejo: esperar a que se reconstruya
+    suggest.get_index(suggest.SUGGEST_LANGS[0])
+    wait_for_rebuilds()
+    default = suggest.get_index(suggest.SUGGEST_LANGS[0])
+    assert suggest.get_index('xx') is default
+    assert set(suggest._indexes) <= set(suggest.SUGGEST_LANGS)
+
+def test_stale_index_is_served_while_rebuilding():
+    old = suggest.get_index('es')
+    ontology._bump_version()
+    assert suggest.get_index('es') is old
+    wait_for_rebuilds()
+    assert suggest._indexes['es'][0] == suggest._source_version()
+    assert suggest.get_index('es') is not old
+
+def test_prefix_lookup():
+    texts = [item['text'] for item in suggest.suggest('canc', 'es')]
+    assert 'Cancer' in texts
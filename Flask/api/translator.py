@@ -1,4 +1,194 @@
+import os
+import sys
+import json
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
 from mtranslate import translate as Translate
 #from googletrans import Translator
-def translate(text, dest): 
-	return Translate(text, dest)
\ No newline at end of file
+
+from lru import LRUCache
+import metrics
+
+# Caché persistente compartido entre reinicios y workers
+CACHE_PATH = os.environ.get('TRANSLATION_CACHE_PATH', str(Path(__file__).parent.resolve()/"translations.sqlite3"))
+CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 20000))
+# Sin servicio de traduccion: los textos no cacheados se devuelven sin traducir
+OFFLINE = os.environ.get('TRANSLATION_OFFLINE', '0') == '1'
+# SQLite limita la cantidad de parametros por consulta
+_SQL_CHUNK = 500
+
+class TranslationCache:
+    """
+    Two-level translation cache: an in-memory LRU backed by a SQLite store
+    keyed by (text, dest).
+
+    Parameters
+    ----------
+    path: str
+        SQLite file, shared by every worker process
+    maxsize: int
+        entries kept in the in-memory LRU
+    """
+
+    def __init__(self, path=CACHE_PATH, maxsize=CACHE_SIZE):
+        self.path = path
+        self.memory = LRUCache(maxsize)
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                dest TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                PRIMARY KEY (text, dest)
+            )
+        """)
+        self._db.commit()
+
+    def get_many(self, texts, dest):
+        """
+        Look up many texts at once.
+
+        Returns
+        -------
+        dict
+            text -> translation for the texts found in memory or on disk
+        """
+        texts = set(texts)
+        found = {}
+        pending = []
+        for text in texts:
+            translation = self.memory.get((text, dest))
+            if translation is None:
+                pending.append(text)
+            else:
+                found[text] = translation
+
+        for i in range(0, len(pending), _SQL_CHUNK):
+            chunk = pending[i:i + _SQL_CHUNK]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT text, translation FROM translations WHERE dest = ? AND text IN ({','.join('?' * len(chunk))})",
+                    [dest, *chunk]
+                ).fetchall()
+            for text, translation in rows:
+                self.memory.set((text, dest), translation)
+                found[text] = translation
+
+        self.disk_hits += len(found) - (len(texts) - len(pending))
+        self.misses += len(texts) - len(found)
+        return found
+
+    def get(self, text, dest):
+        return self.get_many([text], dest).get(text)
+
+    def set_many(self, items):
+        """
+        Store (text, dest, translation) triples in memory and on disk.
+        """
+        items = list(items)
+        for text, dest, translation in items:
+            self.memory.set((text, dest), translation)
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?)", items)
+            self._db.commit()
+
+    def set(self, text, dest, translation):
+        self.set_many([(text, dest, translation)])
+
+    def warm_up(self, file):
+        """
+        Seed the cache from a JSON lines file with `text`, `dest` and `translation` keys.
+
+        Returns
+        -------
+        int
+            number of translations loaded
+        """
+        with open(file, encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        self.set_many((item['text'], item['dest'], item['translation']) for item in items)
+        return len(items)
+
+    def export(self, file):
+        """
+        Dump every stored translation to a JSON lines file usable by `warm_up`.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT text, dest, translation FROM translations").fetchall()
+        with open(file, 'w', encoding='utf-8') as f:
+            for text, dest, translation in rows:
+                f.write(json.dumps({'text': text, 'dest': dest, 'translation': translation}, ensure_ascii=False) + '\n')
+        return len(rows)
+
+    def stats(self):
+        """
+        Hit/miss counters of both cache levels.
+        """
+        return {
+            'memory_hits': self.memory.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_size': len(self.memory),
+            'offline': OFFLINE
+        }
+
+_cache = TranslationCache()
+
+def _cache_metrics():
+    stats = _cache.stats()
+    return {'hits': stats['memory_hits'] + stats['disk_hits'], 'misses': stats['misses'], 'size': stats['memory_size']}
+
+metrics.register_cache('translation', _cache_metrics)
+
+def translate(text, dest):
+    """
+    Translate a text through the shared cache, calling the translation service only on misses.
+    """
+    return translate_many([text], dest)[0]
+
+@metrics.timed('translate')
+def translate_many(texts, dest):
+    """
+    Translate a list of texts with one cache lookup for all of them.
+
+    Duplicated texts are translated once and misses are sent to the
+    translation service concurrently.
+
+    Returns
+    -------
+    list[str]
+        translations aligned with `texts`
+    """
+    texts = [str(text) if text else text for text in texts]
+    wanted = [text for text in texts if text]
+    found = _cache.get_many(wanted, dest)
+
+    missing = list({text for text in wanted if text not in found})
+    if missing and not OFFLINE:
+        if len(missing) == 1:
+            translations = [Translate(missing[0], dest)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(8, len(missing))) as pool:
+                translations = list(pool.map(lambda text: Translate(text, dest), missing))
+        _cache.set_many((text, dest, translation) for text, translation in zip(missing, translations))
+        found.update(zip(missing, translations))
+
+    return [found.get(text, text) if text else text for text in texts]
+
+def cache_stats():
+    return _cache.stats()
+
+if __name__ == '__main__':
+    # python translator.py warmup|export <archivo.jsonl>
+    command, file = sys.argv[1], sys.argv[2]
+    if command == 'warmup':
+        print(f"{_cache.warm_up(file)} traducciones cargadas en {CACHE_PATH}")
+    elif command == 'export':
+        print(f"{_cache.export(file)} traducciones exportadas a {file}")
@@ -29,6 +29,7 @@ function Search() {
   const [loading, setLoading] = useState(false);
   const [searchSource, setSearchSource] = useState('');
   const [mode, setMode] = useState('online'); // online | offline | combined
+  const [suggestions, setSuggestions] = useState([]);
 
   useEffect(() => {
     if (localeParam && translations.includes(localeParam)) {
@@ -36,6 +37,26 @@ function Search() {
     }
   }, [localeParam]);
 
+  // Autocompletado: /suggest con debounce, cancelando la peticion anterior
+  useEffect(() => {
+    const prefix = query.trim();
+    if (!prefix) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      fetch(`${host}/suggest?q=${encodeURIComponent(prefix)}&lang=${locale}&k=8`, { signal: controller.signal })
+        .then(response => response.json())
+        .then(data => setSuggestions(data.suggestions || []))
+        .catch(() => {});
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query, locale]);
+
   const handleSearch = async (e) => {
     if (e) e.preventDefault();
     const trimmedQuery = query.trim();
@@ -128,7 +149,14 @@ function Search() {
                     placeholder={messages[locale]['app.placeholder']}
                     value={query}
                     onChange={(e) => setQuery(e.target.value)}
+                    list='search-suggestions'
+                    autoComplete='off'
                   />
+                  <datalist id='search-suggestions'>
+                    {suggestions.map(s => (
+                      <option key={`${s.type}-${s.iri || s.value}-${s.text}`} value={s.text} />
+                    ))}
+                  </datalist>
                   <Button variant='secondary' id='search-button' type='submit' disabled={loading}>
                     <FormattedMessage id='app.search-button' />
                   </Button>